@@ -1,13 +1,100 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
 from typing import Optional
 import hashlib
+import os
 import time
 import re
+import threading
+import json
+import logging
+import cProfile
+import pstats
+import sqlite3
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import cached_property
+
+from history_store import HistoryStore
 
 # 移除匿名化功能
 
+# 性能诊断：环境变量 SCORE_PROFILE=1 时默认开启（也可在侧边栏切换），各阶段用时输出到 score.profile 日志
+PROFILE_DEFAULT = os.environ.get('SCORE_PROFILE', '').lower() in ('1', 'true', 'yes', 'on')
+profile_logger = logging.getLogger('score.profile')
+
+class StageTimer:
+    """记录一次运行中各阶段的用时和行数，启用时每个阶段结束输出一条结构化日志（JSON）"""
+    
+    def __init__(self, enabled: bool = True, run_id: Optional[str] = None):
+        self.enabled = enabled
+        self.run_id = run_id
+        self.records = []
+        # 附加的诊断信息（如总分范围），显示在诊断面板中
+        self.notes = {}
+    
+    @contextmanager
+    def stage(self, name: str, rows: Optional[int] = None):
+        """计时一个阶段：with timer.stage('读取') as span: ...，行数在结束前可写入 span['rows']"""
+        span = {'rows': rows}
+        if not self.enabled:
+            yield span
+            return
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.record(name, time.perf_counter() - start, span['rows'])
+    
+    def record(self, name: str, seconds: float, rows: Optional[int] = None):
+        """记录一个已完成的阶段（如在后台线程中完成的导出）"""
+        if not self.enabled:
+            return
+        entry = {'stage': name, 'seconds': round(seconds, 6), 'rows': rows}
+        self.records.append(entry)
+        profile_logger.info(json.dumps({'event': 'stage', 'run': self.run_id, **entry}, ensure_ascii=False))
+    
+    def note(self, name: str, value):
+        if self.enabled:
+            self.notes[name] = value
+    
+    def summary(self) -> pd.DataFrame:
+        """各阶段合计用时（毫秒）和行数，按首次出现的顺序"""
+        if not self.records:
+            return pd.DataFrame(columns=['阶段', '用时(毫秒)', '行数'])
+        records = pd.DataFrame(self.records)
+        summary = records.groupby('stage', sort=False).agg(seconds=('seconds', 'sum'), rows=('rows', 'max'))
+        return pd.DataFrame({
+            '阶段': summary.index,
+            '用时(毫秒)': (summary['seconds'] * 1000).round(1).to_numpy(),
+            '行数': summary['rows'].astype('Int64').to_numpy()
+        })
+    
+    @property
+    def total_seconds(self) -> float:
+        return sum(entry['seconds'] for entry in self.records)
+
+# 未开启诊断时使用的计时器（不记录）
+NULL_TIMER = StageTimer(enabled=False)
+
+def configure_profile_logging():
+    """score.profile 日志没有配置处理器时输出到标准错误（部署时可自行配置日志）"""
+    if not profile_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+        profile_logger.addHandler(handler)
+        profile_logger.setLevel(logging.INFO)
+        profile_logger.propagate = False
+
+def format_profile(profiler: cProfile.Profile, limit: int = 40) -> str:
+    """cProfile 结果按累计用时排序的文本报告"""
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
 def calculate_total_score(row):
     """计算总分：总分=(乙部/103*0.7)*100+(甲部/50*0.3)*100"""
     jia_score = float(row['甲部分数'])
@@ -20,49 +107,957 @@ def calculate_total_score(row):
     # 四舍五入为整数
     return round(jia_weighted + yi_weighted)
 
-def process_data(df: pd.DataFrame) -> pd.DataFrame:
-    """处理数据：计算总分、排序、排名"""
-    # 复制数据框避免修改原始数据
-    processed_df = df.copy()
+# 学生信息列（每种计分方案都需要）
+IDENTITY_COLUMNS = ['姓名', '学号', '班级']
+
+# 计算结果中由程序生成的列，不能作为分数列
+GENERATED_COLUMNS = ['总分', '排名', '等级', '班内排名']
+
+# 总分取整方式：名称 -> (说明, 取整函数)
+ROUNDING_MODES = {
+    'half_even': ('四舍六入五成双', np.rint),
+    'half_up': ('四舍五入', lambda totals: np.floor(totals + 0.5)),
+    'floor': ('向下取整', np.floor),
+    'ceil': ('向上取整', np.ceil),
+    'none': ('不取整', None)
+}
+
+class ScoreComponent:
+    """计分方案中的一个部分：分数列、满分和权重（总分 = Σ 分数/满分 × 权重 × 100）"""
+    
+    def __init__(self, column: str, max_score: float, weight: float):
+        self.column = str(column).strip()
+        self.max_score = float(max_score)
+        self.weight = float(weight)
+    
+    def to_dict(self) -> dict:
+        return {'column': self.column, 'max_score': self.max_score, 'weight': self.weight}
+
+class ScoringSchema:
+    """计分方案：各部分的分数列、满分、权重及总分取整方式
+    
+    方案在创建时检查并编译为按列计算的向量化表达式：每个部分一次数组运算后累加到总分，
+    所有行一次算完，增加部分不会退回逐行计算。各部分按声明顺序计算 (分数 / 满分 × 权重) × 100
+    后相加，默认方案的结果与 calculate_total_score 逐位相同。
+    """
+    
+    def __init__(self, components: list, rounding: str = 'half_even', name: str = ''):
+        self.components = [
+            component if isinstance(component, ScoreComponent) else ScoreComponent(**component)
+            for component in components
+        ]
+        self.rounding = rounding
+        self.name = name
+        self._validate()
+    
+    def _validate(self):
+        if not self.components:
+            raise ValueError("计分方案至少需要一个分数列")
+        columns = self.columns
+        if len(set(columns)) != len(columns):
+            raise ValueError("分数列不能重复")
+        for component in self.components:
+            if not component.column:
+                raise ValueError("分数列名不能为空")
+            if component.column in IDENTITY_COLUMNS or component.column in GENERATED_COLUMNS:
+                raise ValueError(f"“{component.column}”不能作为分数列")
+            if not component.max_score > 0:
+                raise ValueError(f"{component.column} 的满分应大于0")
+            if not component.weight >= 0:
+                raise ValueError(f"{component.column} 的权重不能为负数")
+        if sum(component.weight for component in self.components) > 1 + 1e-9:
+            raise ValueError("各部分权重合计不能超过1")
+        if self.rounding not in ROUNDING_MODES:
+            raise ValueError(f"未知的取整方式：{self.rounding}")
+    
+    @property
+    def columns(self) -> list:
+        """分数列（按声明顺序）"""
+        return [component.column for component in self.components]
+    
+    @property
+    def required_columns(self) -> list:
+        """上传文件必须包含的列"""
+        return IDENTITY_COLUMNS + self.columns
+    
+    def column_dtypes(self) -> dict:
+        """必要列的读取类型：文本列按字符串读取（保留学号前导0），分数列按浮点数读取"""
+        return {**dict.fromkeys(IDENTITY_COLUMNS, 'str'), **dict.fromkeys(self.columns, 'float64')}
+    
+    @property
+    def key(self) -> str:
+        """方案的唯一标识，用于缓存键"""
+        parts = [f"{c.column}/{c.max_score:g}*{c.weight:g}" for c in self.components]
+        return f"{'+'.join(parts)}@{self.rounding}"
+    
+    def describe(self) -> str:
+        """总分公式的文字说明"""
+        terms = [f"({c.column}/{c.max_score:g} × {c.weight:g}) × 100" for c in self.components]
+        return f"总分 = {' + '.join(terms)}（{ROUNDING_MODES[self.rounding][0]}）"
+    
+    @cached_property
+    def total_scores(self):
+        """编译后的总分计算函数：total_scores(df) -> 总分数组（取整时为 int64，不取整时为 float64）"""
+        plan = [(c.column, c.max_score, c.weight) for c in self.components]
+        round_totals = ROUNDING_MODES[self.rounding][1]
+        
+        def total_scores(df) -> np.ndarray:
+            total = None
+            for column, max_score, weight in plan:
+                # 每个部分只分配一个新数组，其余运算原地完成
+                part = np.divide(np.asarray(df[column], dtype=np.float64), max_score)
+                part *= weight
+                part *= 100
+                if total is None:
+                    total = part
+                else:
+                    total += part
+            if round_totals is None:
+                return total
+            return round_totals(total).astype(np.int64)
+        
+        return total_scores
+    
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'components': [component.to_dict() for component in self.components],
+            'rounding': self.rounding
+        }
+    
+    @classmethod
+    def from_dict(cls, config: dict) -> 'ScoringSchema':
+        """由配置（如 JSON：{"components": [{"column": ..., "max_score": ..., "weight": ...}], "rounding": ...}）创建"""
+        return cls(config['components'], config.get('rounding', 'half_even'), config.get('name', ''))
+    
+    def __reduce__(self):
+        # 按配置序列化（传给批处理子进程），编译后的函数在使用时重新生成
+        return (ScoringSchema.from_dict, (self.to_dict(),))
+    
+    def __eq__(self, other):
+        return isinstance(other, ScoringSchema) and self.key == other.key
+    
+    def __hash__(self):
+        return hash(self.key)
+
+# 默认计分方案：总分=(乙部/103*0.7)*100+(甲部/50*0.3)*100
+DEFAULT_SCHEMA = ScoringSchema(
+    [ScoreComponent('甲部分数', 50, 0.3), ScoreComponent('乙部分数', 103, 0.7)],
+    name='甲乙两部分'
+)
+
+# 默认计分方案下上传文件必须包含的列
+REQUIRED_COLUMNS = DEFAULT_SCHEMA.required_columns
+
+# 默认计分方案中总分计算用到的分数列
+SCORE_COLUMNS = DEFAULT_SCHEMA.columns
+
+# 总分满分（计数排序使用 0-100 共 101 个桶）
+MAX_TOTAL_SCORE = 100
+
+def can_use_counting_rank(totals: np.ndarray) -> bool:
+    """判断总分是否全部为 0-100 的整数，可使用计数排序"""
+    totals = np.asarray(totals)
+    if len(totals) == 0:
+        return False
+    if not np.issubdtype(totals.dtype, np.integer):
+        if not np.issubdtype(totals.dtype, np.floating) or not np.all(np.mod(totals, 1) == 0):
+            return False
+    return bool(totals.min() >= 0 and totals.max() <= MAX_TOTAL_SCORE)
+
+def counting_rank(totals: np.ndarray) -> tuple:
+    """计数排序排名：用 101 桶直方图在线性时间内得到降序次序和并列最小排名
+    
+    返回 (order, ranks)：order 为按总分降序（同分保持原顺序）的行位置，
+    ranks 为每行（原顺序）的排名，相同分数相同排名，与 rank(method='min') 一致。
+    """
+    scores = np.asarray(totals).astype(np.int64)
+    counts = np.bincount(scores, minlength=MAX_TOTAL_SCORE + 1)
     
-    # 计算总分
-    processed_df['总分'] = processed_df.apply(calculate_total_score, axis=1)
+    # 高于某分数的人数 = 该分数及以上的人数 - 该分数的人数
+    higher = np.cumsum(counts[::-1])[::-1] - counts
+    ranks = higher[scores] + 1
+    
+    # 按 (100 - 总分) 的 uint8 值做稳定排序：NumPy 对 16 位以内整数使用基数排序，为线性时间
+    order = np.argsort((MAX_TOTAL_SCORE - scores).astype(np.uint8), kind='stable')
+    return order, ranks
+
+def process_data(df: pd.DataFrame, ranking: str = 'auto', timer: StageTimer = NULL_TIMER,
+                 schema: ScoringSchema = DEFAULT_SCHEMA) -> pd.DataFrame:
+    """处理数据：按计分方案计算总分、排序、排名
     
-    # 按总分降序排序
-    processed_df = processed_df.sort_values('总分', ascending=False)
+    ranking: 'auto'（总分为 0-100 整数时使用计数排序，否则使用通用排序）、
+    'counting'（强制计数排序）或 'sort'（通用排序）
+    """
+    if ranking not in ('auto', 'counting', 'sort'):
+        raise ValueError(f"未知的排名方式：{ranking}")
     
-    # 计算排名（相同分数相同排名，类似WPS的RANK函数）
-    processed_df['排名'] = processed_df['总分'].rank(method='min', ascending=False).astype(int)
+    # 计算总分（不复制输入数据，只生成新的总分列）
+    with timer.stage('计算总分', len(df)):
+        totals = schema.total_scores(df)
     
+    with timer.stage('排序/排名', len(df)):
+        processed_df = _sort_and_rank(df, totals, ranking)
     return processed_df
 
-def assign_grades(df: pd.DataFrame, cutoff_scores: dict) -> pd.DataFrame:
-    """根据cutoff分数分配等级"""
-    df_with_grades = df.copy()
+def _sort_and_rank(df: pd.DataFrame, totals: np.ndarray, ranking: str) -> pd.DataFrame:
+    """按总分降序取行并写入总分和排名列（process_data 的排序部分）"""
+    use_counting = ranking == 'counting' or (ranking == 'auto' and can_use_counting_rank(totals))
+    if use_counting:
+        if not can_use_counting_rank(totals):
+            raise ValueError("计数排序仅适用于 0-100 之间的整数总分")
+        # 一次直方图同时得到排序和排名
+        order, ranks = counting_rank(totals)
+        sorted_ranks = ranks[order]
+    else:
+        # 按总分降序排序（稳定排序，同分保持原顺序）
+        order = np.argsort(-totals, kind='stable')
+        # 计算排名（相同分数相同排名，类似WPS的RANK函数）
+        sorted_ranks = pd.Series(totals[order]).rank(method='min', ascending=False).astype(int).to_numpy()
+    
+    # 按排序结果取行是唯一一次复制，新列直接写入结果
+    processed_df = df.take(order)
+    processed_df['总分'] = totals[order]
+    processed_df['排名'] = sorted_ranks
+    
+    return processed_df
+
+# 等级从低到高（Level2最低，Level7最高）
+GRADE_LEVELS = ['Level2', 'Level3', 'Level4', 'Level5', 'Level6', 'Level7']
+UNGRADED_LEVEL = '未定级'
+
+# 默认等级分数线
+DEFAULT_CUTOFFS = {
+    'Level2': 47,
+    'Level3': 53,
+    'Level4': 58,
+    'Level5': 63,
+    'Level6': 66,
+    'Level7': 70
+}
+
+# 等级列使用有序分类类型：编码 0 为未定级，1-6 对应 Level2-Level7
+GRADE_DTYPE = pd.CategoricalDtype([UNGRADED_LEVEL] + GRADE_LEVELS, ordered=True)
+
+def grade_thresholds(cutoff_scores: dict) -> tuple:
+    """把cutoff分数整理为分箱边界
     
-    # 初始化等级列
-    df_with_grades['等级'] = '未定级'
+    返回 (codes, thresholds)：thresholds 为单调不减的分数线，codes[0] 为未定级的编码，
+    codes[i] 为分数不低于 thresholds[i-1] 时的等级编码（GRADE_DTYPE 中的位置）。
+    """
+    # cutoff 为 0 表示不启用该等级
+    active = [(code, cutoff_scores[level]) for code, level in enumerate(GRADE_LEVELS, start=1)
+              if level in cutoff_scores and cutoff_scores[level] > 0]
     
-    # 按分数从低到高分配等级（Level2最低，Level7最高）
-    levels = ['Level2', 'Level3', 'Level4', 'Level5', 'Level6', 'Level7']
+    codes = np.array([0] + [code for code, _ in active], dtype=np.int8)
+    thresholds = np.array([cutoff for _, cutoff in active], dtype=np.float64)
     
-    for level in levels:
-        if level in cutoff_scores and cutoff_scores[level] > 0:
-            mask = df_with_grades['总分'] >= cutoff_scores[level]
-            df_with_grades.loc[mask, '等级'] = level
+    # 高等级覆盖低等级：取后缀最小值使分数线单调不减，即使输入的分数线没有递增也与逐级覆盖结果一致
+    if len(thresholds):
+        thresholds = np.minimum.accumulate(thresholds[::-1])[::-1]
+    
+    return codes, thresholds
+
+def grade_codes(scores, cutoff_scores: dict) -> np.ndarray:
+    """根据cutoff分数计算每个分数的等级编码（GRADE_DTYPE 中的位置）"""
+    codes, thresholds = grade_thresholds(cutoff_scores)
+    
+    # 一次二分查找完成分箱：低于所有分数线的落入编码 0（未定级）
+    bins = np.searchsorted(thresholds, np.asarray(scores), side='right')
+    return codes[bins]
+
+def assign_grades(df: pd.DataFrame, cutoff_scores: dict) -> pd.DataFrame:
+    """根据cutoff分数分配等级（浅复制，只新增等级列，不复制其他列）"""
+    df_with_grades = df.copy(deep=False)
+    
+    codes = grade_codes(df_with_grades['总分'], cutoff_scores)
+    df_with_grades['等级'] = pd.Categorical.from_codes(codes, dtype=GRADE_DTYPE)
     
     return df_with_grades
 
-def validate_cutoff_input(value: str) -> Optional[int]:
-    """验证等级分数线输入"""
-    try:
-        score = int(value)
-        if 0 <= score <= 100:
-            return score
+# 紧凑存储时分数列使用的类型
+COMPACT_SCORE_DTYPE = np.float32
+
+def _smallest_uint(max_value: int):
+    """能容纳 0 到 max_value 的最小无符号整数类型"""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+def compact_frame(df: pd.DataFrame, score_columns: Optional[list] = None) -> pd.DataFrame:
+    """把成绩数据转换为紧凑类型，减少每个会话的内存占用
+    
+    - 班级、等级：分类类型
+    - 总分、排名：能容纳其取值的最小无符号整数
+    - 分数列（默认为甲/乙部分数）：float32（总分已按 float64 计算，显示和导出时用 widen_scores 还原）
+    - 学号：全部为不以0开头的数字时转为整数，否则转为分类类型（相同学号只存一份）
+    """
+    columns = {}
+    if '班级' in df.columns and not isinstance(df['班级'].dtype, pd.CategoricalDtype):
+        columns['班级'] = df['班级'].astype('category')
+    
+    for col in ('总分', '排名'):
+        if col in df.columns and np.issubdtype(df[col].dtype, np.integer) and len(df) and df[col].min() >= 0:
+            columns[col] = df[col].astype(_smallest_uint(int(df[col].max())))
+    
+    for col in SCORE_COLUMNS if score_columns is None else score_columns:
+        if col in df.columns and df[col].dtype == np.float64:
+            columns[col] = df[col].astype(COMPACT_SCORE_DTYPE)
+    
+    if '学号' in df.columns and df['学号'].dtype != np.int64:
+        student_ids = df['学号'].astype('str')
+        if len(df) and student_ids.str.fullmatch(r'[1-9][0-9]{0,17}').all():
+            columns['学号'] = student_ids.astype(np.int64)
+        else:
+            columns['学号'] = student_ids.astype('category')
+    
+    return df.assign(**columns) if columns else df
+
+def widen_scores(df: pd.DataFrame) -> pd.DataFrame:
+    """把 float32 分数列还原为 float64（按最短十进制表示还原，45.3 不会变成 45.29999924）"""
+    columns = {col: df[col].astype(str).astype(np.float64) for col in df.columns if df[col].dtype == np.float32}
+    return df.assign(**columns) if columns else df
+
+def frame_memory(df: pd.DataFrame) -> int:
+    """数据框占用的内存（字节，包括字符串内容）"""
+    return int(df.memory_usage(deep=True).sum())
+
+def readonly_array(array: np.ndarray) -> np.ndarray:
+    """把数组标记为只读（不复制），原地修改时抛出 ValueError"""
+    array.flags.writeable = False
+    return array
+
+def readonly_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """与 df 共享数据的只读数据框：数值列和分类列的编码不可原地修改（如 df.loc[...] = ... 抛出 ValueError），
+    派生新的数据框或整列替换不受影响；字符串列本身不可变，直接共享"""
+    columns = {}
+    for col in df.columns:
+        column = df[col]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes = readonly_array(column.array.codes)
+            columns[col] = pd.Categorical.from_codes(codes, dtype=column.dtype, validate=False)
+        elif isinstance(column.dtype, np.dtype):
+            columns[col] = readonly_array(column.to_numpy())
+        else:
+            columns[col] = column.array
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+# 等级颜色映射
+LEVEL_COLORS = {
+    'Level2': '#FFE6E6',  # 浅红色
+    'Level3': '#FFF2E6',  # 浅橙色
+    'Level4': '#FFFFE6',  # 浅黄色
+    'Level5': '#E6FFE6',  # 浅绿色
+    'Level6': '#E6F3FF',  # 浅蓝色
+    'Level7': '#F0E6FF',  # 浅紫色
+    '未定级': '#F5F5F5'   # 浅灰色
+}
+
+# 等级分布表中各等级的图标
+LEVEL_ICONS = {
+    'Level7': '🥇',
+    'Level6': '🥈',
+    'Level5': '🥉',
+    'Level4': '🏅',
+    'Level3': '🎖️',
+    'Level2': '📊'
+}
+
+# Styler 着色的单元格上限（pandas 默认渲染上限为 262144 个单元格）
+STYLE_MAX_CELLS = 200_000
+
+def level_styles(df: pd.DataFrame) -> pd.DataFrame:
+    """按等级生成整行背景色样式：每个等级编码只映射一次颜色，再广播到所有列"""
+    css = np.array([f'background-color: {LEVEL_COLORS[level]}' for level in GRADE_DTYPE.categories], dtype=object)
+    
+    # 非分类类型或未知等级按未定级着色
+    codes = pd.Categorical(df['等级'], dtype=GRADE_DTYPE).codes
+    row_css = css[np.where(codes < 0, 0, codes)]
+    
+    return pd.DataFrame(np.broadcast_to(row_css[:, None], df.shape), index=df.index, columns=df.columns)
+
+def style_levels(df: pd.DataFrame, max_cells: int = STYLE_MAX_CELLS):
+    """按等级为结果表着色
+    
+    单元格数不超过 max_cells 时整行着色；超出时仅为等级列着色；
+    行数也超出时返回原数据框（不着色）。
+    """
+    if df.size <= max_cells:
+        return df.style.apply(level_styles, axis=None)
+    if len(df) <= max_cells:
+        return df.style.apply(level_styles, axis=None, subset=['等级'])
+    return df
+
+# 结果表每页行数选项：页面只发送当前页的数据
+PAGE_SIZE_OPTIONS = [50, 100, 500, 1000]
+DEFAULT_PAGE_SIZE = 100
+
+def _text_matches(column: pd.Series, query: str) -> np.ndarray:
+    """列中包含 query 的行；分类列只在类别上匹配，再按类别编码展开到各行"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        matched = column.cat.categories.astype(str).str.contains(query, regex=False)
+        return np.isin(column.cat.codes.to_numpy(), np.flatnonzero(matched))
+    return column.astype(str).str.contains(query, regex=False, na=False).to_numpy()
+
+def filter_results(df: pd.DataFrame, classes: Optional[list] = None, levels: Optional[list] = None,
+                   query: str = '') -> pd.DataFrame:
+    """按班级、等级筛选，并按学号或姓名搜索（包含关系）；条件为空时不筛选"""
+    mask = np.ones(len(df), dtype=bool)
+    if classes:
+        mask &= df['班级'].isin(classes).to_numpy()
+    if levels and '等级' in df.columns:
+        mask &= df['等级'].isin(levels).to_numpy()
+    query = query.strip()
+    if query:
+        mask &= _text_matches(df['学号'], query) | _text_matches(df['姓名'], query)
+    return df if mask.all() else df[mask]
+
+def page_bounds(total_rows: int, page: int, page_size: int) -> tuple:
+    """第 page 页（从1开始，超出范围时取最近的页）的 (起始行, 结束行, 总页数)"""
+    pages = max(1, -(-total_rows // page_size))
+    page = min(max(page, 1), pages)
+    start = (page - 1) * page_size
+    return start, min(start + page_size, total_rows), pages
+
+# 导出Excel时每批转换的行数（逐批写出，内存占用与总行数无关）
+EXPORT_CHUNK_ROWS = 10_000
+
+def estimate_column_widths(df: pd.DataFrame) -> list:
+    """估算导出Excel的列宽：各列（去重后）最长文本长度与列名长度取大，再加 2"""
+    widths = []
+    for col_name in df.columns:
+        values = pd.Series(df[col_name].dropna().unique())
+        max_len = values.astype(str).str.len().max() if len(values) else 0
+        widths.append(max(max_len, len(str(col_name))) + 2)
+    return widths
+
+def export_results_excel(df: pd.DataFrame, sheet_name: str = '计算结果') -> bytes:
+    """导出带等级颜色的Excel文件
+    
+    使用 openpyxl 只写模式逐行写出，内存占用不随行数增长；等级颜色通过条件格式规则
+    （每个等级一条，作用于整张表）实现，不为每个单元格单独设置填充。
+    分批只限制内存，不减少用时：用时几乎都在 openpyxl 逐个单元格生成 XML（约每万行 1.4 秒），随行数线性增长。
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.formatting.rule import FormulaRule
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.utils import get_column_letter
+    
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet_name)
+    
+    # 设置列宽（只写模式下须在写入数据前设置）
+    for col_idx, width in enumerate(estimate_column_widths(df), start=1):
+        worksheet.column_dimensions[get_column_letter(col_idx)].width = width
+    
+    # 按等级列的值为整行着色
+    if '等级' in df.columns and len(df) > 0:
+        level_letter = get_column_letter(df.columns.get_loc('等级') + 1)  # Excel列从1开始
+        data_range = f"A2:{get_column_letter(len(df.columns))}{len(df) + 1}"  # Excel行从2开始（跳过标题）
+        for level, color in LEVEL_COLORS.items():
+            fill = PatternFill(start_color=color[1:], end_color=color[1:], fill_type='solid')
+            rule = FormulaRule(formula=[f'${level_letter}2="{level}"'], fill=fill, stopIfTrue=True)
+            worksheet.conditional_formatting.add(data_range, rule)
+    
+    # 标题行
+    header_font = Font(bold=True)
+    header = []
+    for col_name in df.columns:
+        cell = WriteOnlyCell(worksheet, value=str(col_name))
+        cell.font = header_font
+        header.append(cell)
+    worksheet.append(header)
+    
+    # 数据行：逐批转换为 Python 对象后写出，空值写为空单元格
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        chunk = widen_scores(df.iloc[start:start + EXPORT_CHUNK_ROWS]).astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            worksheet.append(row)
+    
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+class ScoreDistribution:
+    """总分分布：升序排列的总分数组及各分数人数
+    
+    任意一组cutoff下各等级的人数只需在累计人数上查表，不必逐行重新分配等级。
+    """
+    
+    def __init__(self, sorted_scores: np.ndarray, counts: Optional[np.ndarray] = None):
+        self.sorted_scores = sorted_scores
+        if counts is not None:
+            # 已知的 101 桶直方图（增量计算时由上一次的直方图更新得到）
+            self.values = np.arange(MAX_TOTAL_SCORE + 1)
+            self.counts = counts
+        elif can_use_counting_rank(sorted_scores):
+            # 0-100 的整数总分：101 桶直方图
+            self.values = np.arange(MAX_TOTAL_SCORE + 1)
+            self.counts = np.bincount(sorted_scores.astype(np.int64), minlength=MAX_TOTAL_SCORE + 1)
         else:
+            self.values, self.counts = np.unique(sorted_scores, return_counts=True)
+        
+        # at_least[i] 为总分 ≥ values[i] 的人数，末尾补 0 表示高于最高分的人数
+        self._at_least = np.append(np.cumsum(self.counts[::-1])[::-1], 0)
+    
+    @classmethod
+    def from_processed(cls, processed_df: pd.DataFrame) -> 'ScoreDistribution':
+        """由 process_data 的结果构建（结果已按总分降序排列，反转即为升序，无需再排序）"""
+        return cls(processed_df['总分'].to_numpy()[::-1])
+    
+    @property
+    def total(self) -> int:
+        return len(self.sorted_scores)
+    
+    def count_at_least(self, scores) -> np.ndarray:
+        """总分不低于给定分数的人数"""
+        return self._at_least[np.searchsorted(self.values, scores, side='left')]
+    
+    def level_counts(self, cutoff_scores: dict) -> dict:
+        """各等级人数（按 GRADE_DTYPE 顺序，包含人数为 0 的等级）"""
+        codes, thresholds = grade_thresholds(cutoff_scores)
+        
+        # 每个分箱的人数 = 不低于本分数线的人数 - 不低于下一条分数线的人数
+        at_least = np.concatenate(([self.total], self.count_at_least(thresholds), [0]))
+        bin_counts = at_least[:-1] - at_least[1:]
+        
+        counts = dict.fromkeys(GRADE_DTYPE.categories, 0)
+        for code, count in zip(codes, bin_counts):
+            counts[GRADE_DTYPE.categories[code]] = int(count)
+        return counts
+
+# 按比例设置分数线时各等级的默认人数比例（%），其余学生为未定级
+DEFAULT_QUOTAS = {'Level7': 10, 'Level6': 15, 'Level5': 20, 'Level4': 20, 'Level3': 15, 'Level2': 10}
+
+def solve_cutoffs(distribution: ScoreDistribution, quotas: dict) -> dict:
+    """按各等级人数比例（%）求 0-100 的整数分数线
+    
+    在全部 101 条候选分数线上查累计人数表，每个等级取使“不低于该等级的人数”最接近
+    目标累计比例的分数线。同分学生总在同一等级，比例只能尽量接近；误差相同时取较高的分数线。
+    比例为0的等级不启用（分数线为0）；分数线 0 表示不启用，因此求得的分数线至少为 1。
+    """
+    shares = [quotas.get(level, 0) for level in GRADE_LEVELS]
+    if any(share < 0 for share in shares) or sum(shares) > 100:
+        raise ValueError("各等级比例应不小于0，且合计不超过100%")
+    
+    candidates = np.arange(MAX_TOTAL_SCORE + 1)
+    at_least = distribution.count_at_least(candidates)
+    
+    cutoffs = {}
+    cumulative_share = 0
+    upper = MAX_TOTAL_SCORE
+    for level in reversed(GRADE_LEVELS):
+        share = quotas.get(level, 0)
+        if share == 0:
+            cutoffs[level] = 0
+            continue
+        cumulative_share += share
+        error = np.abs(at_least - distribution.total * cumulative_share / 100)
+        # 反向查找最小误差，误差相同时得到较高的分数线；低等级的分数线不高于高等级
+        upper = max(min(upper, MAX_TOTAL_SCORE - int(np.argmin(error[::-1]))), 1)
+        cutoffs[level] = upper
+    return {level: cutoffs[level] for level in GRADE_LEVELS}
+
+def scenario_level_codes(scores: np.ndarray, cutoff_matrix: np.ndarray) -> np.ndarray:
+    """多组分数线下每个分数的等级编码（GRADE_DTYPE 中的位置），返回 方案数×分数个数 的矩阵
+    
+    cutoff_matrix 每行为一组分数线（按 GRADE_LEVELS 顺序），0 表示不启用该等级。
+    与 grade_codes 相同，高等级覆盖低等级：取分数达到的最高启用等级。
+    """
+    cutoff_matrix = np.asarray(cutoff_matrix, dtype=np.float64)
+    cutoff_matrix = np.where(cutoff_matrix > 0, cutoff_matrix, np.inf)
+    # reached[方案, 分数, 等级]：分数是否达到该等级的分数线
+    reached = np.asarray(scores, dtype=np.float64)[None, :, None] >= cutoff_matrix[:, None, :]
+    level_codes = np.arange(1, len(GRADE_LEVELS) + 1, dtype=np.int8)
+    return (reached * level_codes).max(axis=2, initial=0).astype(np.int8)
+
+def evaluate_scenarios(distribution: ScoreDistribution, scenarios: pd.DataFrame,
+                       current_cutoffs: dict) -> pd.DataFrame:
+    """一次评估多组分数线方案：各等级人数、占比，以及与当前分数线相比等级变化的人数
+    
+    scenarios 每行为一组分数线（列为 GRADE_LEVELS）。所有方案在总分分布（每个分数的人数）上
+    广播计算，用时与学生人数无关。
+    """
+    cutoff_matrix = scenarios[GRADE_LEVELS].to_numpy(dtype=np.float64)
+    codes = scenario_level_codes(distribution.values, cutoff_matrix)
+    current_codes = grade_codes(distribution.values, current_cutoffs)
+    
+    # 各方案各等级人数：按等级编码展开后乘以每个分数的人数
+    categories = GRADE_DTYPE.categories
+    one_hot = codes[:, :, None] == np.arange(len(categories))
+    level_counts = (one_hot * distribution.counts[None, :, None]).sum(axis=1)
+    changed = ((codes != current_codes[None, :]) * distribution.counts[None, :]).sum(axis=1)
+    
+    result = pd.DataFrame(index=scenarios.index)
+    total = max(distribution.total, 1)
+    for code, level in reversed(list(enumerate(categories))):
+        result[f"{level}人数"] = level_counts[:, code]
+    for code, level in reversed(list(enumerate(categories))):
+        result[f"{level}占比"] = level_counts[:, code] / total * 100
+    result['等级变化人数'] = changed
+    return result
+
+# 班级统计中的百分位数
+CLASS_PERCENTILES = {'P25': 0.25, '中位数': 0.5, 'P75': 0.75, 'P90': 0.9}
+
+class ClassAnalytics:
+    """按班级的总分统计
+    
+    一次遍历建立 班级×总分 直方图，各班人数、平均分、最高/最低分、百分位数、班内排名
+    以及任意分数线下的 班级×等级 交叉表都由直方图得到，不再分别扫描整表。
+    """
+    
+    def __init__(self, classes: pd.Series, totals: np.ndarray):
+        class_values = classes.astype('category')
+        self.class_names = class_values.cat.categories
+        # 没有班级的学生放在直方图最后一行：只计入全体统计
+        class_codes = class_values.cat.codes.to_numpy().astype(np.int64)
+        class_codes[class_codes < 0] = len(self.class_names)
+        
+        if can_use_counting_rank(totals):
+            self.values = np.arange(MAX_TOTAL_SCORE + 1)
+            score_codes = totals.astype(np.int64)
+        else:
+            self.values, score_codes = np.unique(totals, return_inverse=True)
+        
+        # _histogram[班级, 分数] 为该班该分数的人数
+        num_values = len(self.values)
+        shape = (len(self.class_names) + 1, num_values)
+        self._histogram = np.bincount(
+            class_codes * num_values + score_codes, minlength=shape[0] * num_values
+        ).reshape(shape)
+        
+        # 班内排名 = 同班总分高于本人的人数 + 1（相同分数相同排名），没有班级时为 0
+        at_least = np.cumsum(self._histogram[:, ::-1], axis=1)[:, ::-1]
+        self.class_ranks = at_least[class_codes, score_codes] - self._histogram[class_codes, score_codes] + 1
+        self.class_ranks[class_codes == len(self.class_names)] = 0
+    
+    @classmethod
+    def from_processed(cls, processed_df: pd.DataFrame) -> 'ClassAnalytics':
+        return cls(processed_df['班级'], processed_df['总分'].to_numpy())
+    
+    @property
+    def histogram(self) -> np.ndarray:
+        """各班（不含没有班级的学生）的总分直方图"""
+        return self._histogram[:-1]
+    
+    @property
+    def nbytes(self) -> int:
+        return self._histogram.nbytes + self.values.nbytes + self.class_ranks.nbytes
+    
+    def class_rank_column(self) -> pd.array:
+        """班内排名列（没有班级的学生为空）"""
+        return pd.arrays.IntegerArray(self.class_ranks.astype(np.uint32), self.class_ranks == 0)
+    
+    @staticmethod
+    def _quantiles(histogram: np.ndarray, values: np.ndarray, q: float) -> np.ndarray:
+        """各行的分位数（线性插值，与 pandas 的 quantile 一致）"""
+        counts = histogram.sum(axis=1)
+        cumulative = np.cumsum(histogram, axis=1)
+        position = (np.maximum(counts, 1) - 1) * q
+        lower, upper = np.floor(position), np.ceil(position)
+        # 第 k 个（从0开始）分数：累计人数首次超过 k 的分数
+        lower_value = values[(cumulative > lower[:, None]).argmax(axis=1)]
+        upper_value = values[(cumulative > upper[:, None]).argmax(axis=1)]
+        result = lower_value + (upper_value - lower_value) * (position - lower)
+        return np.where(counts > 0, result, np.nan)
+    
+    def _summarize(self, histogram: np.ndarray) -> dict:
+        """直方图各行的人数、平均分、最高分、最低分和百分位数（没有学生的行为 NaN）"""
+        counts = histogram.sum(axis=1)
+        summary = {'人数': counts}
+        if len(self.values) == 0:
+            for name in ['平均分', '最高分', '最低分', *CLASS_PERCENTILES]:
+                summary[name] = np.full(len(counts), np.nan)
+            return summary
+        
+        present = histogram > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            summary['平均分'] = (histogram @ self.values) / counts
+        summary['最高分'] = np.where(counts > 0, self.values[len(self.values) - 1 - present[:, ::-1].argmax(axis=1)], np.nan)
+        summary['最低分'] = np.where(counts > 0, self.values[present.argmax(axis=1)], np.nan)
+        for name, q in CLASS_PERCENTILES.items():
+            summary[name] = self._quantiles(histogram, self.values, q)
+        return summary
+    
+    def summary(self) -> pd.DataFrame:
+        """各班人数、平均分、最高分、最低分和百分位数，按平均分从高到低排列"""
+        summary = pd.DataFrame(self._summarize(self.histogram), index=pd.Index(self.class_names, name='班级'))
+        return summary.sort_values('平均分', ascending=False, kind='stable')
+    
+    def overall(self) -> dict:
+        """全体学生（包括没有班级的学生）的统计"""
+        summary = self._summarize(self._histogram.sum(axis=0, keepdims=True))
+        return {name: values[0] for name, values in summary.items()}
+    
+    def crosstab(self, cutoff_scores: dict) -> pd.DataFrame:
+        """班级×等级 人数交叉表（列按 GRADE_DTYPE 顺序）"""
+        codes = grade_codes(self.values, cutoff_scores)
+        level_matrix = np.eye(len(GRADE_DTYPE.categories), dtype=np.int64)[codes]
+        return pd.DataFrame(
+            self.histogram @ level_matrix,
+            index=pd.Index(self.class_names, name='班级'),
+            columns=GRADE_DTYPE.categories
+        )
+
+def match_students(old_ids: pd.Series, new_ids: pd.Series) -> np.ndarray:
+    """按学号找出新数据每行在旧数据中的位置（没有对应的行为 -1；旧数据中学号重复时取第一次出现的行）
+    
+    两边都是整数学号时直接比较，否则按文本比较（分类列只转换类别）。
+    """
+    def keys(ids: pd.Series) -> pd.Index:
+        if pd.api.types.is_integer_dtype(ids.dtype):
+            return pd.Index(ids.to_numpy())
+        if isinstance(ids.dtype, pd.CategoricalDtype):
+            return pd.Index(ids.cat.categories.astype(str).append(pd.Index(['nan']))[ids.cat.codes.to_numpy()])
+        return pd.Index(ids.astype(str))
+    
+    if pd.api.types.is_integer_dtype(old_ids.dtype) != pd.api.types.is_integer_dtype(new_ids.dtype):
+        old_keys, new_keys = pd.Index(old_ids.astype(str)), pd.Index(new_ids.astype(str))
+    else:
+        old_keys, new_keys = keys(old_ids), keys(new_ids)
+    
+    if old_keys.is_unique:
+        return old_keys.get_indexer(new_keys)
+    first = np.flatnonzero(~old_keys.duplicated())
+    found = old_keys[first].get_indexer(new_keys)
+    return np.where(found >= 0, first[found], -1)
+
+class ScoredCohort:
+    """一次上传的计算结果：计算结果及总分分布
+    
+    只保存一份数据（计算结果），原始数据由计算结果按原行号还原，不重复存储。
+    同一份文件的结果由所有会话共享，其中的数据框和数组都是只读的，各会话只在其上派生自己的结果（如按各自的分数线定级）。
+    """
+    
+    def __init__(self, key: str, processed_df: pd.DataFrame, source_columns: list,
+                 read_seconds: float = 0.0, issues: Optional[pd.DataFrame] = None,
+                 schema: 'ScoringSchema' = DEFAULT_SCHEMA, distribution: Optional[ScoreDistribution] = None):
+        # 缓存键：文件内容摘要（只读取部分列时附加所读的列）
+        self.key = key
+        self.processed_df = readonly_frame(processed_df)
+        # 上传文件中的列（计算结果在此之后追加了总分和排名）
+        self.source_columns = list(source_columns)
+        # 计算总分使用的计分方案
+        self.schema = schema
+        self.distribution = distribution if distribution is not None else ScoreDistribution.from_processed(self.processed_df)
+        for array in (self.distribution.values, self.distribution.counts, self.distribution._at_least):
+            readonly_array(array)
+        # 读取文件用时（秒），用于显示解析速度
+        self.read_seconds = read_seconds
+        # 校验问题报告（有问题的行未参与计算），见 validate_scores
+        self.issues = pd.DataFrame(columns=ISSUE_COLUMNS) if issues is None else issues
+    
+    @cached_property
+    def analytics(self) -> ClassAnalytics:
+        """班级统计（首次使用时计算，与计算结果一起缓存）"""
+        analytics = ClassAnalytics.from_processed(self.processed_df)
+        for array in (analytics.values, analytics.class_ranks, analytics._histogram):
+            readonly_array(array)
+        return analytics
+    
+    @cached_property
+    def original_order(self) -> np.ndarray:
+        """按原行号排列时各行在计算结果中的位置（首次查看原始数据时计算）"""
+        return readonly_array(np.argsort(self.processed_df.index.to_numpy(), kind='stable'))
+    
+    def original_rows(self, start: int = 0, stop: Optional[int] = None) -> pd.DataFrame:
+        """原始数据的第 start 到 stop 行：只取出这些行和上传文件中的列，不还原整表"""
+        positions = self.processed_df.columns.get_indexer(self.source_columns)
+        return self.processed_df.iloc[self.original_order[start:stop], positions]
+    
+    @property
+    def original_df(self) -> pd.DataFrame:
+        """原始数据：计算结果按原行号恢复上传时的顺序，只保留上传文件中的列"""
+        return self.original_rows()
+    
+    def memory_usage(self) -> dict:
+        """各部分占用的内存（字节）"""
+        distribution = self.distribution
+        usage = {
+            '计算结果': frame_memory(self.processed_df),
+            '总分分布': distribution.counts.nbytes + distribution.values.nbytes + distribution._at_least.nbytes
+        }
+        if len(self.issues):
+            usage['问题报告'] = frame_memory(self.issues)
+        if 'original_order' in self.__dict__:
+            usage['原始顺序'] = self.original_order.nbytes
+        if 'analytics' in self.__dict__:
+            usage['班级统计'] = self.analytics.nbytes
+        return usage
+    
+    def nbytes(self) -> int:
+        return sum(self.memory_usage().values())
+
+def rescore_delta(previous: ScoredCohort, df: pd.DataFrame, schema: 'ScoringSchema' = DEFAULT_SCHEMA,
+                  timer: StageTimer = NULL_TIMER) -> Optional[tuple]:
+    """增量计算：按学号与上一次的计算结果对比，只重新计算修改和新增的行
+    
+    新数据先转换为紧凑类型，按学号与上一次的结果比较各分数列（在紧凑存储的 float32 精度内比较），
+    分数相同的行沿用上一次的总分（其他列直接取自新数据，修改姓名等不需要重新计算）；总分直方图减去删除和修改前的总分、加上修改后和新增的总分，
+    排名直接由直方图查表得到。未修改的行在上一次的结果中已按（总分降序，行号）排列，
+    修改和新增的行排序后按同样的键二分插入，不对整表重新排序。
+    
+    返回 (紧凑类型的计算结果, 总分分布)，与 process_data 后 compact_frame 的结果相同；
+    计分方案或列不同、计分方案不取整或总分不是 0-100 的整数、学号不唯一或未修改的行顺序被调整时返回 None，由调用方完整计算。
+    """
+    old_df = previous.processed_df
+    if previous.schema != schema or previous.source_columns != list(df.columns) or len(old_df) == 0:
+        return None
+    # 直方图按 0-100 的整数总分分桶：不取整的方案（总分分布按不同取值统计）不能增量更新
+    old_totals = old_df['总分'].to_numpy()
+    if schema.rounding == 'none' or not can_use_counting_rank(old_totals):
+        return None
+    
+    n = len(df)
+    compact_df = compact_frame(df, schema.columns)
+    # 紧凑类型的学号为整数或分类编码，检查重复很快
+    if old_df['学号'].duplicated().any() or compact_df['学号'].duplicated().any():
+        return None
+    # 每行在上一次结果中的位置（-1 为新增），各分数列都相同的行为未修改
+    matches = match_students(old_df['学号'], compact_df['学号'])
+    unchanged = matches >= 0
+    for col in schema.columns:
+        unchanged[unchanged] &= old_df[col].to_numpy()[matches[unchanged]] == compact_df[col].to_numpy()[unchanged]
+    unchanged_rows = np.flatnonzero(unchanged)
+    changed_rows = np.flatnonzero(~unchanged)
+    
+    totals = np.empty(n, dtype=np.int64)
+    totals[unchanged_rows] = old_totals[matches[unchanged_rows]]
+    if len(changed_rows):
+        changed_totals = schema.total_scores(df.iloc[changed_rows])
+        if not can_use_counting_rank(changed_totals):
             return None
-    except ValueError:
+        totals[changed_rows] = changed_totals
+    
+    # 更新直方图：上一次结果中没有原样保留的行（删除或修改）减去旧总分
+    kept = np.zeros(len(old_df), dtype=bool)
+    kept[matches[unchanged_rows]] = True
+    counts = previous.distribution.counts.copy()
+    counts -= np.bincount(old_totals[~kept], minlength=MAX_TOTAL_SCORE + 1)
+    counts += np.bincount(totals[changed_rows], minlength=MAX_TOTAL_SCORE + 1)
+    higher = np.cumsum(counts[::-1])[::-1] - counts
+    
+    # 排序键：(100 - 总分) × (行数 + 1) + 行号，与 process_data 的稳定降序排序一致
+    new_position = np.full(len(old_df), -1, dtype=np.int64)
+    new_position[matches[unchanged_rows]] = unchanged_rows
+    kept_rows = new_position[kept]
+    kept_keys = (MAX_TOTAL_SCORE - totals[kept_rows]) * (n + 1) + kept_rows
+    if np.any(np.diff(kept_keys) <= 0):
         return None
+    changed_keys = (MAX_TOTAL_SCORE - totals[changed_rows]) * (n + 1) + changed_rows
+    changed_order = np.argsort(changed_keys, kind='stable')
+    slots = np.searchsorted(kept_keys, changed_keys[changed_order]) + np.arange(len(changed_rows))
+    
+    order = np.empty(n, dtype=np.int64)
+    is_changed_slot = np.zeros(n, dtype=bool)
+    is_changed_slot[slots] = True
+    order[slots] = changed_rows[changed_order]
+    order[~is_changed_slot] = kept_rows
+    
+    processed_df = compact_df.take(order)
+    sorted_totals = totals[order]
+    sorted_ranks = higher[sorted_totals] + 1
+    processed_df['总分'] = sorted_totals.astype(_smallest_uint(int(sorted_totals.max())))
+    processed_df['排名'] = sorted_ranks.astype(_smallest_uint(int(sorted_ranks.max())))
+    
+    added = int((matches < 0).sum())
+    timer.note('增量计算', f"分数修改 {len(changed_rows) - added} 行，新增 {added} 行，删除 {len(old_df) - (n - added)} 行")
+    return processed_df, ScoreDistribution(sorted_totals[::-1], counts)
+
+# 上传对比中的变动类型
+DELTA_ADDED = '🆕 新增'
+DELTA_REMOVED = '❌ 删除'
+DELTA_SCORE = '✏️ 总分变化'
+DELTA_RANK = '↕️ 排名变化'
+
+def compare_cohorts(previous: ScoredCohort, current: ScoredCohort) -> pd.DataFrame:
+    """按学号对比两次上传的计算结果，列出新增、删除、总分或排名有变化的学生（按新排名排列，删除的学生在最后）
+    
+    列：学号、姓名、班级、变动、原总分、总分、原排名、排名、排名变化（上升为正；新增或删除的学生缺少的一侧为空）
+    """
+    old_df, new_df = previous.processed_df, current.processed_df
+    matches = match_students(old_df['学号'], new_df['学号'])
+    matched = matches >= 0
+    
+    old_totals = np.full(len(new_df), np.nan)
+    old_ranks = np.full(len(new_df), np.nan)
+    old_totals[matched] = old_df['总分'].to_numpy()[matches[matched]]
+    old_ranks[matched] = old_df['排名'].to_numpy()[matches[matched]]
+    new_totals = new_df['总分'].to_numpy().astype(np.float64)
+    new_ranks = new_df['排名'].to_numpy().astype(np.float64)
+    
+    change = np.full(len(new_df), '', dtype=object)
+    change[matched & (old_ranks != new_ranks)] = DELTA_RANK
+    change[matched & (old_totals != new_totals)] = DELTA_SCORE
+    change[~matched] = DELTA_ADDED
+    moved = np.flatnonzero(change != '')
+    
+    removed = np.ones(len(old_df), dtype=bool)
+    removed[matches[matched]] = False
+    removed = np.flatnonzero(removed)
+    
+    def students(df: pd.DataFrame, rows: np.ndarray) -> dict:
+        return {col: df[col].to_numpy()[rows] for col in ('学号', '姓名', '班级')}
+    
+    frames = [pd.DataFrame({
+        **students(new_df, moved),
+        '变动': change[moved],
+        '原总分': old_totals[moved],
+        '总分': new_totals[moved],
+        '原排名': old_ranks[moved],
+        '排名': new_ranks[moved]
+    })]
+    if len(removed):
+        frames.append(pd.DataFrame({
+            **students(old_df, removed),
+            '变动': DELTA_REMOVED,
+            '原总分': old_df['总分'].to_numpy()[removed].astype(np.float64),
+            '总分': np.nan,
+            '原排名': old_df['排名'].to_numpy()[removed].astype(np.float64),
+            '排名': np.nan
+        }))
+    moves = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    
+    # 排名（及整数总分）用可空整数类型显示
+    integer_columns = ['原排名', '排名']
+    totals = moves[['原总分', '总分']].to_numpy()
+    if np.all(np.isnan(totals) | (np.mod(totals, 1) == 0)):
+        integer_columns += ['原总分', '总分']
+    moves = moves.astype(dict.fromkeys(integer_columns, 'Int64'))
+    moves['排名变化'] = (moves['原排名'] - moves['排名']).astype('Int64')
+    return moves
+
+def delta_levels(moves: pd.DataFrame, cutoff_scores: dict) -> pd.DataFrame:
+    """为对比结果加上按当前分数线的原等级、等级（缺少的一侧为空）及等级变化（⬆️ 升级 / ⬇️ 降级）"""
+    codes = {}
+    for total_col, level_col in (('原总分', '原等级'), ('总分', '等级')):
+        totals = moves[total_col].to_numpy(dtype=np.float64, na_value=np.nan)
+        codes[level_col] = np.where(np.isnan(totals), -1, grade_codes(np.nan_to_num(totals), cutoff_scores))
+    
+    old_codes, new_codes = codes['原等级'], codes['等级']
+    both = (old_codes >= 0) & (new_codes >= 0)
+    change = np.where(both & (new_codes > old_codes), '⬆️ 升级', np.where(both & (new_codes < old_codes), '⬇️ 降级', ''))
+    return moves.assign(
+        **{col: pd.Categorical.from_codes(level_codes, dtype=GRADE_DTYPE) for col, level_codes in codes.items()},
+        等级变化=change
+    )
+
+def session_memory_report(state, cohort: Optional[ScoredCohort] = None) -> dict:
+    """统计会话数据占用的内存（字节）：成绩数据（会话只保存其缓存键，由调用方传入）按组成部分列出，
+    会话状态中其余的数据框和文件内容按键名列出"""
+    report = cohort.memory_usage() if cohort is not None else {}
+    for key, value in state.items():
+        if isinstance(value, ScoredCohort):
+            report.update(value.memory_usage())
+        elif isinstance(value, pd.DataFrame):
+            report[key] = frame_memory(value)
+        elif isinstance(value, (bytes, bytearray)):
+            report[key] = len(value)
+    return report
 
 def validate_cutoff_input(value: str) -> Optional[int]:
     """验证等级分数线输入"""
@@ -75,6 +1070,906 @@ def validate_cutoff_input(value: str) -> Optional[int]:
     except ValueError:
         return None
 
+class LRUCache:
+    """线程安全的有界LRU缓存，记录命中/未命中次数及各条目占用的字节数（进程内所有会话共享）"""
+    
+    def __init__(self, max_entries: int, sizeof=None, pinned=None):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # 计算条目占用字节数的函数，用于按内存预算淘汰
+        self._sizeof = sizeof or (lambda value: 0)
+        # 返回正在使用、不按条目数淘汰的缓存键的函数（如活跃会话正在查看的数据）
+        self._pinned = pinned or (lambda: ())
+        self._entries = OrderedDict()
+        self._sizes = {}
+        # 正在计算的条目：{缓存键: Future}，同一个键同时只计算一次
+        self._pending = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+    
+    def peek(self, key, default=None):
+        """读取缓存（不计入命中/未命中，但更新使用顺序）"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            return default
+    
+    def put(self, key, value):
+        size = self._sizeof(value)
+        pinned = set(self._pinned())
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            # 超出容量时淘汰最久未使用且未在使用中的条目；都在使用中时暂时超出容量（由内存预算限制）
+            for evicted in list(self._entries):
+                if len(self._entries) <= self.max_entries:
+                    break
+                if evicted != key and evicted not in pinned:
+                    del self._entries[evicted]
+                    del self._sizes[evicted]
+    
+    def pop(self, key) -> int:
+        """移除条目，返回释放的字节数（不存在时为0）"""
+        with self._lock:
+            self._entries.pop(key, None)
+            return self._sizes.pop(key, 0)
+    
+    def keys(self) -> list:
+        """按使用顺序（最久未使用在前）列出缓存键"""
+        with self._lock:
+            return list(self._entries)
+    
+    def size_of(self, key) -> int:
+        with self._lock:
+            return self._sizes.get(key, 0)
+    
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(self._sizes.values())
+    
+    def __contains__(self, key):
+        """检查是否已缓存（不计入命中/未命中，也不更新使用顺序）"""
+        with self._lock:
+            return key in self._entries
+    
+    def get_or_compute(self, key, compute):
+        """命中时直接返回缓存值，否则调用 compute() 计算并写入缓存
+        
+        同一个键同时只计算一次：计算期间其他线程等待并共享其结果（计为命中），计算出错时一起收到该异常。
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            future = self._pending.get(key)
+            computing = future is None
+            if computing:
+                future = self._pending[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        
+        if not computing:
+            return future.result()
+        try:
+            value = compute()
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'pending': len(self._pending),
+                'bytes': sum(self._sizes.values())
+            }
+
+# 超过该大小（字节）的CSV文件分块读取，限制解析时的峰值内存
+CSV_CHUNK_THRESHOLD = 64 * 1024 * 1024
+CSV_CHUNK_ROWS = 200_000
+
+# 解析/处理结果缓存：按文件内容摘要索引，所有会话共享，最多保留的文件数（活跃会话正在使用的文件不计入淘汰）
+UPLOAD_CACHE_SIZE = 8
+_upload_cache = LRUCache(UPLOAD_CACHE_SIZE, sizeof=lambda cohort: cohort.nbytes(),
+                         pinned=lambda: _sessions.cohort_refcounts())
+
+class MissingColumnsError(ValueError):
+    """上传文件缺少必要的列"""
+    
+    def __init__(self, missing_columns: list):
+        self.missing_columns = missing_columns
+        super().__init__(f"文件缺少必要的列：{', '.join(missing_columns)}")
+
+def file_digest(data: bytes) -> str:
+    """计算文件内容摘要，作为缓存键"""
+    return hashlib.sha256(data).hexdigest()
+
+def select_columns(header, columns: Optional[list] = None, required: list = REQUIRED_COLUMNS) -> list:
+    """检查必要列并返回需要读取的列：columns 为要保留的其他列，None 表示保留全部列"""
+    missing_columns = [col for col in required if col not in header]
+    if missing_columns:
+        raise MissingColumnsError(missing_columns)
+    
+    if columns is None:
+        return list(header)
+    return [col for col in header if col in required or col in columns]
+
+def apply_column_dtypes(df: pd.DataFrame, schema: ScoringSchema = DEFAULT_SCHEMA) -> pd.DataFrame:
+    """必要列转换为计分方案的读取类型：文本列转为字符串，分数列转为 float64
+    
+    文本列中的空白单元格保持为空值（不转换为字符串 'nan'），validate_scores 据此找出学号为空的行；
+    分数列含无法转换的内容（如“缺考”）时保留原值，由 validate_scores 一次找出所有问题单元格。
+    """
+    dtypes = schema.column_dtypes()
+    df = df.assign(**{
+        col: df[col].astype(dtype).where(df[col].notna())
+        for col, dtype in dtypes.items() if dtype == 'str' and col in df.columns and df[col].dtype != dtype
+    })
+    for col in schema.columns:
+        if df[col].dtype != np.float64:
+            try:
+                df[col] = df[col].astype(np.float64)
+            except (ValueError, TypeError):
+                pass
+    return df
+
+def coerce_scores(column: pd.Series) -> tuple:
+    """把分数列转换为 float64，返回 (分数, 非数字掩码)；空白单元格为空值（缺考），不算非数字"""
+    if pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_bool_dtype(column.dtype):
+        return column.astype(np.float64), np.zeros(len(column), dtype=bool)
+    
+    values = pd.to_numeric(column, errors='coerce').astype(np.float64)
+    # 只有无法直接转换的非空单元格需要按文本检查（去掉空白后再转换，空白单元格按缺考处理）
+    failed = np.flatnonzero(values.isna().to_numpy() & column.notna().to_numpy())
+    non_numeric = np.zeros(len(column), dtype=bool)
+    if len(failed):
+        text = column.iloc[failed].astype('str').str.strip()
+        retried = pd.to_numeric(text.mask(text == ''), errors='coerce').to_numpy(dtype=np.float64)
+        values.iloc[failed] = retried
+        non_numeric[failed] = np.isnan(retried) & (text != '').to_numpy()
+    return values, non_numeric
+
+# 校验问题报告的列
+ISSUE_COLUMNS = ['序号', '学号', '姓名', '列', '值', '问题']
+
+def validate_scores(df: pd.DataFrame, schema: ScoringSchema = DEFAULT_SCHEMA) -> tuple:
+    """一次向量化校验所有分数列和学号，返回 (有效行, 问题报告)
+    
+    非数字、负数、超过满分的分数，以及学号为空或重复（第一次出现之外）的行被跳过，
+    其余行的空白分数按0分处理。问题报告每个问题一行，序号为该行在文件中的记录序号
+    （从1开始，不含标题行和跳过的空行）。
+    """
+    invalid = np.zeros(len(df), dtype=bool)
+    issues = []
+    
+    def flag(mask: np.ndarray, column: str, values: pd.Series, problem):
+        positions = np.flatnonzero(mask)
+        if len(positions):
+            flagged = values.iloc[positions]
+            if values.dtype == np.float64:
+                # 数字按最短形式显示（120 而不是 120.0）
+                flagged = pd.Series(np.char.mod('%g', flagged.to_numpy()))
+            issues.append(pd.DataFrame({
+                '序号': positions + 1,
+                '列': column,
+                '值': flagged.astype('str').to_numpy(),
+                '问题': problem[positions] if isinstance(problem, np.ndarray) else problem
+            }))
+            invalid[positions] = True
+    
+    scores = {}
+    for component in schema.components:
+        raw = df[component.column]
+        values, non_numeric = coerce_scores(raw)
+        array = values.to_numpy()
+        flag(non_numeric, component.column, raw, '不是数字')
+        with np.errstate(invalid='ignore'):
+            flag(array < 0, component.column, raw, '分数为负数')
+            flag(array > component.max_score, component.column, raw, f"超过满分{component.max_score:g}")
+        scores[component.column] = values.fillna(0)
+    
+    student_ids = df['学号']
+    # 学号用于匹配重新上传的记录和保存历史成绩，不能为空
+    missing_ids = (student_ids.isna() | (student_ids.astype('str').str.strip() == '')).to_numpy()
+    flag(missing_ids, '学号', student_ids, '学号为空')
+    duplicated = student_ids.duplicated().to_numpy() & ~missing_ids
+    if duplicated.any():
+        # 每个学号第一次出现的记录序号
+        first = pd.Series(np.arange(1, len(df) + 1)).groupby(student_ids.to_numpy(), dropna=False).transform('min').to_numpy()
+        problem = np.char.add(np.char.add('与第', first.astype(np.int64).astype(str)), '条记录学号重复')
+        flag(duplicated, '学号', student_ids, problem)
+    
+    if issues:
+        report = pd.concat(issues, ignore_index=True).sort_values('序号', kind='stable', ignore_index=True)
+        positions = report['序号'].to_numpy() - 1
+        report['学号'] = student_ids.iloc[positions].to_numpy()
+        report['姓名'] = df['姓名'].iloc[positions].to_numpy()
+        report = report[ISSUE_COLUMNS]
+    else:
+        report = pd.DataFrame(columns=ISSUE_COLUMNS)
+    
+    valid_df = df.assign(**scores)
+    if invalid.any():
+        valid_df = valid_df[~invalid].reset_index(drop=True)
+    return valid_df, report
+
+def read_csv_fast(data: bytes, columns: Optional[list] = None,
+                  chunk_threshold: int = CSV_CHUNK_THRESHOLD, schema: ScoringSchema = DEFAULT_SCHEMA) -> pd.DataFrame:
+    """读取CSV：只解析需要的列，必要列按计分方案的 column_dtypes 转换类型（见 apply_column_dtypes）
+    
+    安装了 pyarrow 时使用其多线程解析器；文件超过 chunk_threshold 时用 C 引擎分块读取。
+    """
+    usecols = select_columns(pd.read_csv(io.BytesIO(data), nrows=0).columns, columns, schema.required_columns)
+    # 只在解析时指定文本列的类型；分数列由解析器推断，含文本的单元格不会中断读取
+    text_dtypes = {col: dtype for col, dtype in schema.column_dtypes().items() if col in usecols and dtype == 'str'}
+    
+    if len(data) > chunk_threshold:
+        chunks = pd.read_csv(io.BytesIO(data), usecols=usecols, dtype=text_dtypes, chunksize=CSV_CHUNK_ROWS)
+        return apply_column_dtypes(pd.concat(chunks, ignore_index=True), schema)
+    
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        return apply_column_dtypes(pd.read_csv(io.BytesIO(data), usecols=usecols, dtype=text_dtypes), schema)
+    
+    # 空白的文本单元格与 pandas 引擎一致读取为空值，而不是空字符串
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=usecols,
+        column_types={col: pa.string() for col in text_dtypes},
+        strings_can_be_null=True
+    )
+    return apply_column_dtypes(pa_csv.read_csv(io.BytesIO(data), convert_options=convert_options).to_pandas(), schema)
+
+def list_excel_sheets(data: bytes) -> list:
+    """列出xlsx文件中的工作表名称（只读模式，不解析单元格）"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(io.BytesIO(data), read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+def read_excel_streaming(data: bytes, sheet_name: Optional[str] = None,
+                         columns: Optional[list] = None, schema: ScoringSchema = DEFAULT_SCHEMA) -> pd.DataFrame:
+    """快速读取xlsx：只读取指定工作表中需要的列
+    
+    安装了 python-calamine 时使用其解析器（Rust 实现），否则用 openpyxl 只读模式逐行迭代。
+    sheet_name 为空时读取第一个工作表；空行被跳过，必要列按 apply_column_dtypes 转换类型，
+    与 read_csv_fast 的结果一致。
+    """
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return _read_excel_openpyxl(data, sheet_name, columns, schema)
+    
+    dtypes = schema.column_dtypes()
+    wanted = None if columns is None else set(schema.required_columns) | set(columns)
+    df = pd.read_excel(
+        io.BytesIO(data),
+        engine='calamine',
+        sheet_name=sheet_name or 0,
+        usecols=None if wanted is None else (lambda col: col in wanted),
+        dtype={col: dtype for col, dtype in dtypes.items() if dtype == 'str'}
+    )
+    df = df[select_columns(df.columns, columns, schema.required_columns)]
+    df = df.dropna(how='all').reset_index(drop=True)
+    return apply_column_dtypes(df, schema)
+
+def _read_excel_openpyxl(data: bytes, sheet_name: Optional[str] = None,
+                         columns: Optional[list] = None, schema: ScoringSchema = DEFAULT_SCHEMA) -> pd.DataFrame:
+    """openpyxl 只读模式逐行读取xlsx，只保留需要的列（read_excel_streaming 的后备实现）"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        # 部分软件导出的文件记录的表格范围不准确，按实际内容读取
+        worksheet.reset_dimensions()
+        rows = worksheet.iter_rows(values_only=True)
+        
+        header = [f"Unnamed: {i}" if value is None else str(value) for i, value in enumerate(next(rows, ()))]
+        usecols = select_columns(header, columns, schema.required_columns)
+        indices = [header.index(col) for col in usecols]
+        
+        records = []
+        for row in rows:
+            record = tuple(row[i] if i < len(row) else None for i in indices)
+            # 跳过空行
+            if any(value is not None for value in record):
+                records.append(record)
+    finally:
+        workbook.close()
+    
+    df = pd.DataFrame.from_records(records, columns=usecols)
+    return apply_column_dtypes(df, schema)
+
+def read_upload(file_name: str, data: bytes, columns: Optional[list] = None,
+                sheet_name: Optional[str] = None, timer: StageTimer = NULL_TIMER,
+                schema: ScoringSchema = DEFAULT_SCHEMA) -> tuple:
+    """读取上传文件内容，检查必要列（学生信息列及计分方案中的分数列）并校验分数和学号
+    
+    columns 为除必要列外要保留的列，None 表示保留文件中的全部列；sheet_name 为要读取的xlsx工作表。
+    返回 (有效行, 问题报告) 两个数据框：有问题的行不在有效行中，问题报告格式见 validate_scores。
+    """
+    with timer.stage('读取') as span:
+        if file_name.endswith('.csv'):
+            df = read_csv_fast(data, columns, schema=schema)
+        elif file_name.endswith('.xlsx'):
+            df = read_excel_streaming(data, sheet_name, columns, schema)
+        else:
+            df = pd.read_excel(io.BytesIO(data), sheet_name=sheet_name or 0)
+            df = apply_column_dtypes(df[select_columns(df.columns, columns, schema.required_columns)], schema)
+        span['rows'] = len(df)
+    
+    # 跳过有问题的行，其余行分数列的空值按0分处理
+    with timer.stage('填充/校验', len(df)):
+        valid_df, issues = validate_scores(df, schema)
+    if len(issues):
+        timer.note('校验问题', f"{len(issues)} 处，跳过 {len(df) - len(valid_df)} 行")
+    
+    return valid_df, issues
+
+def load_upload(file_name: str, data: bytes, columns: Optional[list] = None,
+                sheet_name: Optional[str] = None, timer: StageTimer = NULL_TIMER,
+                schema: ScoringSchema = DEFAULT_SCHEMA, previous: Optional[ScoredCohort] = None) -> ScoredCohort:
+    """读取并处理上传文件，结果按内容摘要（及读取的列、工作表、计分方案）缓存
+    
+    相同内容的文件（重复上传、刷新页面、其他老师上传同一份总表）直接复用缓存结果，
+    缓存中的数据框不可原地修改。命中缓存时 timer 中不记录读取和计算阶段。
+    previous 为同一会话上一次上传的计算结果，给出时先尝试增量计算（见 rescore_delta）。
+    """
+    key = file_digest(data)
+    if columns is not None:
+        key += f":cols={'|'.join(columns)}"
+    if sheet_name:
+        key += f":sheet={sheet_name}"
+    if schema != DEFAULT_SCHEMA:
+        key += f":schema={schema.key}"
+    
+    def parse():
+        start = time.perf_counter()
+        df, issues = read_upload(file_name, data, columns, sheet_name, timer, schema)
+        read_seconds = time.perf_counter() - start
+        
+        # 修改后重新上传的文件只重新计算分数有变化的行
+        delta = None
+        if previous is not None:
+            with timer.stage('增量计算', len(df)):
+                delta = rescore_delta(previous, df, schema, timer)
+        if delta is not None:
+            processed_df, distribution = delta
+        else:
+            # 总分按原始精度计算后再转换为紧凑类型；只保留计算结果，读取的数据框随即释放
+            processed_df = process_data(df, timer=timer, schema=schema)
+            with timer.stage('压缩存储', len(processed_df)):
+                processed_df = compact_frame(processed_df, schema.columns)
+            distribution = None
+        return ScoredCohort(key, processed_df, df.columns, read_seconds, issues, schema, distribution)
+    
+    cohort = _upload_cache.get_or_compute(key, parse)
+    enforce_memory_budget()
+    return cohort
+
+def cached_cohort(key: str) -> Optional[ScoredCohort]:
+    """按缓存键取出已缓存的计算结果（会话只保存缓存键）；已按内存预算释放时返回 None"""
+    return _upload_cache.peek(key)
+
+def upload_cache_stats() -> dict:
+    """上传缓存的命中/未命中统计"""
+    return _upload_cache.stats()
+
+# 内存预算（MB）：单个会话的数据和导出文件上限，以及所有会话共享的缓存总上限，可用环境变量调整
+SESSION_MEMORY_BUDGET_MB = float(os.environ.get('SCORE_SESSION_MEMORY_MB', 256))
+GLOBAL_MEMORY_BUDGET_MB = float(os.environ.get('SCORE_GLOBAL_MEMORY_MB', 1024))
+
+# 超过该时间（秒）没有操作的会话视为空闲，超出预算时优先释放其数据和导出文件
+SESSION_IDLE_SECONDS = float(os.environ.get('SCORE_SESSION_IDLE_SECONDS', 600))
+
+class SessionRegistry:
+    """记录各会话最近一次操作的时间及其正在使用的缓存条目（数据缓存键和导出缓存键）"""
+    
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+    
+    def touch(self, session_id: str, cohort_key: Optional[str] = None, export_keys=()):
+        with self._lock:
+            self._sessions[session_id] = {
+                'last_seen': time.monotonic(),
+                'cohort_key': cohort_key,
+                'export_keys': set(export_keys)
+            }
+    
+    def forget(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+    
+    def _active_sessions(self, idle_seconds: float) -> list:
+        """活跃会话的记录；空闲超时的会话（包括已关闭的页面）不再记录"""
+        deadline = time.monotonic() - idle_seconds
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if session['last_seen'] < deadline:
+                    del self._sessions[session_id]
+            return list(self._sessions.values())
+    
+    def active_keys(self, idle_seconds: float = SESSION_IDLE_SECONDS) -> tuple:
+        """活跃会话使用的 (数据缓存键集合, 导出缓存键集合)"""
+        cohort_keys, export_keys = set(), set()
+        for session in self._active_sessions(idle_seconds):
+            cohort_keys.add(session['cohort_key'])
+            export_keys |= session['export_keys']
+        return cohort_keys, export_keys
+    
+    def cohort_refcounts(self, idle_seconds: float = SESSION_IDLE_SECONDS) -> Counter:
+        """各数据缓存键被多少个活跃会话使用（多位老师上传同一份总表时共享一份数据）"""
+        return Counter(
+            session['cohort_key'] for session in self._active_sessions(idle_seconds)
+            if session['cohort_key'] is not None
+        )
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+_sessions = SessionRegistry()
+
+def current_session_id() -> Optional[str]:
+    """当前 Streamlit 会话的ID（不在 Streamlit 中运行时为 None）"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+def cache_memory_bytes() -> int:
+    """数据缓存和导出文件缓存占用的内存（字节）"""
+    return _upload_cache.total_bytes() + _export_cache.total_bytes()
+
+def enforce_memory_budget(budget_bytes: Optional[int] = None,
+                          idle_seconds: float = SESSION_IDLE_SECONDS) -> int:
+    """缓存总占用超出全局预算时按最久未使用顺序释放条目，返回释放的字节数
+    
+    依次释放：空闲会话的导出文件 → 空闲会话的数据 → 活跃会话的导出文件（可重新生成）；
+    活跃会话正在查看的数据不释放。被释放数据的会话再次访问时从上传的文件重新读取。
+    """
+    if budget_bytes is None:
+        budget_bytes = int(GLOBAL_MEMORY_BUDGET_MB * 1024 * 1024)
+    
+    active_cohorts, active_exports = _sessions.active_keys(idle_seconds)
+    freed = 0
+    for cache, protected in ((_export_cache, active_exports), (_upload_cache, active_cohorts), (_export_cache, set())):
+        for key in cache.keys():
+            if cache_memory_bytes() <= budget_bytes:
+                return freed
+            if key not in protected:
+                freed += cache.pop(key)
+    return freed
+
+def trim_session_exports(cohort_key: str, export_keys: list, budget_bytes: Optional[int] = None) -> list:
+    """会话的数据和导出文件超出单会话预算时，从最早生成的导出文件开始释放，返回保留的导出缓存键
+    
+    导出文件按 export_keys 的顺序（最早的在前）释放，最近一次导出始终保留。
+    """
+    if budget_bytes is None:
+        budget_bytes = int(SESSION_MEMORY_BUDGET_MB * 1024 * 1024)
+    
+    kept = [key for key in export_keys if key in _export_cache]
+    used = _upload_cache.size_of(cohort_key) + sum(_export_cache.size_of(key) for key in kept)
+    while used > budget_bytes and len(kept) > 1:
+        used -= _export_cache.pop(kept.pop(0))
+    return kept
+
+# 导出文件缓存：按 (数据缓存键, 分数线) 索引，最多保留的文件数
+EXPORT_CACHE_SIZE = 16
+_export_cache = LRUCache(EXPORT_CACHE_SIZE, sizeof=len)
+
+# 后台导出线程池及正在生成的导出任务
+_export_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='excel-export')
+_export_futures = {}
+_export_lock = threading.Lock()
+
+# 最近生成的导出文件的用时和行数：{导出缓存键: (秒, 行数)}
+_export_timings = LRUCache(EXPORT_CACHE_SIZE)
+
+def export_key(cohort_key: str, cutoff_scores: dict) -> tuple:
+    """导出文件的缓存键：数据缓存键 + 分数线"""
+    return cohort_key, tuple(sorted(cutoff_scores.items()))
+
+def _build_export(key: tuple, processed_df: pd.DataFrame, cutoff_scores: dict) -> bytes:
+    """在后台线程中分配等级并生成Excel文件，完成后写入缓存（失败的任务保留，以便界面显示错误）"""
+    start = time.perf_counter()
+    data = export_results_excel(assign_grades(processed_df, cutoff_scores))
+    seconds = time.perf_counter() - start
+    _export_timings.put(key, (seconds, len(processed_df)))
+    profile_logger.info(json.dumps({'event': 'export', 'seconds': round(seconds, 6), 'rows': len(processed_df)}))
+    _export_cache.put(key, data)
+    with _export_lock:
+        _export_futures.pop(key, None)
+    enforce_memory_budget()
+    return data
+
+def _export_failed(future: Future) -> bool:
+    return future.done() and future.exception() is not None
+
+def request_export(cohort: 'ScoredCohort', cutoff_scores: dict) -> Future:
+    """请求导出Excel文件：已缓存时立即完成，正在生成时复用同一任务，否则（或上次失败时）提交到后台线程"""
+    key = export_key(cohort.key, cutoff_scores)
+    with _export_lock:
+        future = _export_futures.get(key)
+        if future is not None and not _export_failed(future):
+            return future
+        
+        data = _export_cache.get(key)
+        if data is not None:
+            future = Future()
+            future.set_result(data)
+            return future
+        
+        future = _export_executor.submit(_build_export, key, cohort.processed_df, dict(cutoff_scores))
+        _export_futures[key] = future
+        return future
+
+def export_status(cohort: 'ScoredCohort', cutoff_scores: dict) -> str:
+    """导出状态：'ready'（已缓存）、'pending'（正在生成）、'failed'（生成失败）或 'none'（尚未请求）"""
+    key = export_key(cohort.key, cutoff_scores)
+    if key in _export_cache:
+        return 'ready'
+    with _export_lock:
+        future = _export_futures.get(key)
+    if future is None:
+        return 'none'
+    return 'failed' if _export_failed(future) else 'pending'
+
+def remember_export(cohort: 'ScoredCohort', cutoff_scores: dict):
+    """记录本会话请求过的导出文件（按请求顺序），用于单会话内存预算"""
+    key = export_key(cohort.key, cutoff_scores)
+    export_keys = [k for k in st.session_state.get('export_keys', []) if k != key]
+    st.session_state['export_keys'] = export_keys + [key]
+
+def render_export_panel(cohort: 'ScoredCohort', cutoff_scores: dict, timer: StageTimer = NULL_TIMER):
+    """下载区域：点击后才在后台生成Excel文件，生成期间定时刷新本区域"""
+    status = export_status(cohort, cutoff_scores)
+    export_timing = _export_timings.peek(export_key(cohort.key, cutoff_scores))
+    if export_timing is not None:
+        seconds, rows = export_timing
+        timer.note('导出（后台）', f"{seconds * 1000:.1f} 毫秒，{rows} 行")
+    
+    @st.fragment(run_every=1.0 if status == 'pending' else None)
+    def export_panel():
+        current_status = export_status(cohort, cutoff_scores)
+        
+        if current_status == 'none':
+            if st.button("📦 生成Excel文件"):
+                request_export(cohort, cutoff_scores)
+                remember_export(cohort, cutoff_scores)
+                st.rerun()
+        elif current_status == 'pending':
+            st.info("⏳ 正在后台生成Excel文件，可以继续查看或调整其他设置...")
+        elif status == 'pending':
+            # 生成结束，整页刷新以停止定时刷新
+            st.rerun()
+        elif current_status == 'failed':
+            with _export_lock:
+                future = _export_futures.get(export_key(cohort.key, cutoff_scores))
+            if future is not None:
+                st.error(f"❌ 生成Excel文件时出错：{str(future.exception())}")
+            if st.button("🔁 重新生成"):
+                request_export(cohort, cutoff_scores)
+                remember_export(cohort, cutoff_scores)
+                st.rerun()
+        else:
+            excel_data = request_export(cohort, cutoff_scores).result()
+            remember_export(cohort, cutoff_scores)
+            
+            # 生成文件名
+            timestamp = int(time.time())
+            filename = f"成绩计算结果_{timestamp}.xlsx"
+            
+            st.download_button(
+                label="📥 下载Excel文件",
+                data=excel_data,
+                file_name=filename,
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+    
+    export_panel()
+
+def render_quota_solver(container, distribution: ScoreDistribution):
+    """侧边栏：输入各等级人数比例，一次计算出分数线并直接应用"""
+    with container.expander("🎯 按比例设置分数线", expanded=False):
+        st.caption("输入各等级人数占比（%），按总分分布计算最接近的整数分数线；占比为0的等级不启用")
+        quotas = {}
+        for level in reversed(GRADE_LEVELS):
+            quotas[level] = st.number_input(
+                f"{level} 占比（%）",
+                min_value=0.0,
+                max_value=100.0,
+                value=float(DEFAULT_QUOTAS[level]),
+                step=1.0,
+                key=f"{level.lower()}_quota"
+            )
+        
+        total_share = sum(quotas.values())
+        if total_share > 100:
+            st.error(f"比例合计 {total_share:g}%，不能超过100%")
+        else:
+            st.caption(f"其余 {100 - total_share:g}% 为未定级")
+        
+        if st.button("🎯 计算并应用分数线", disabled=total_share > 100):
+            st.session_state['cutoffs'] = solve_cutoffs(distribution, quotas)
+            st.session_state['sync_cutoff_inputs'] = True
+            st.rerun()
+
+def default_scenarios(cutoff_scores: dict) -> pd.DataFrame:
+    """方案对比的初始方案：当前分数线，以及整体下调、上调2分（未启用的等级保持为0）"""
+    rows = {
+        '当前': cutoff_scores,
+        '整体-2分': {level: max(score - 2, 1) if score > 0 else 0 for level, score in cutoff_scores.items()},
+        '整体+2分': {level: min(score + 2, 100) if score > 0 else 0 for level, score in cutoff_scores.items()}
+    }
+    scenarios = pd.DataFrame.from_dict(rows, orient='index')[GRADE_LEVELS]
+    return scenarios.rename_axis('方案').reset_index()
+
+def render_scenario_panel(distribution: ScoreDistribution, current_cutoffs: dict):
+    """分数线方案对比：编辑多组分数线，一次算出各方案的等级人数、占比和等级变化人数"""
+    with st.expander("🧪 分数线方案对比", expanded=False):
+        st.caption("每行一组分数线（0 表示不启用该等级），可直接编辑或添加行，所有方案一次算出")
+        if 'scenario_base' not in st.session_state or st.button("↩️ 以当前分数线重置方案"):
+            st.session_state['scenario_base'] = default_scenarios(current_cutoffs)
+            st.session_state.pop('scenario_editor', None)
+        
+        edited = st.data_editor(
+            st.session_state['scenario_base'],
+            num_rows='dynamic',
+            hide_index=True,
+            use_container_width=True,
+            key='scenario_editor',
+            column_config={
+                '方案': st.column_config.TextColumn('方案'),
+                **{level: st.column_config.NumberColumn(level, min_value=0, max_value=100, step=1)
+                   for level in GRADE_LEVELS}
+            }
+        )
+        
+        # 忽略未填完的行，未命名的方案按行号命名
+        scenarios = edited.dropna(subset=GRADE_LEVELS).reset_index(drop=True)
+        if scenarios.empty:
+            st.info("请至少填写一组完整的分数线")
+            return
+        names = scenarios['方案'].fillna('').astype(str).str.strip()
+        scenarios.index = np.where(names != '', names, 'S' + (scenarios.index + 1).astype(str))
+        
+        result = evaluate_scenarios(distribution, scenarios, current_cutoffs)
+        st.dataframe(
+            result,
+            use_container_width=True,
+            column_config={
+                column: st.column_config.NumberColumn(column, format="%.1f%%")
+                for column in result.columns if column.endswith('占比')
+            }
+        )
+        
+        col_select, col_apply = st.columns([2, 1])
+        with col_select:
+            position = st.selectbox(
+                "选择方案",
+                range(len(scenarios)),
+                format_func=lambda i: scenarios.index[i],
+                label_visibility='collapsed'
+            )
+        with col_apply:
+            if st.button("✅ 应用所选方案"):
+                st.session_state['cutoffs'] = {level: int(scenarios.iloc[position][level]) for level in GRADE_LEVELS}
+                st.session_state['sync_cutoff_inputs'] = True
+                st.rerun()
+
+def render_paged_table(key: str, total_rows: int, get_rows, styled: bool = False,
+                       timer: StageTimer = NULL_TIMER):
+    """分页显示结果表：get_rows(start, stop) 取出当前页的行，只有这些行被着色并发送到浏览器"""
+    page_key = f"{key}_page"
+    col_size, col_page, col_info = st.columns([1, 1, 2])
+    with col_size:
+        page_size = st.selectbox(
+            "每页行数",
+            PAGE_SIZE_OPTIONS,
+            index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE),
+            key=f"{key}_page_size"
+        )
+    
+    # 筛选条件或每页行数变化后总页数可能减少，先把页码限制在范围内
+    pages = page_bounds(total_rows, 1, page_size)[2]
+    st.session_state[page_key] = min(st.session_state.get(page_key, 1), pages)
+    with col_page:
+        page = st.number_input("页码", min_value=1, step=1, key=page_key)
+    
+    start, stop, pages = page_bounds(total_rows, page, page_size)
+    with col_info:
+        if total_rows == 0:
+            st.caption("没有符合条件的记录")
+        else:
+            st.caption(f"第 {start + 1}-{stop} 条，共 {total_rows} 条（{pages} 页）")
+    
+    page_df = widen_scores(get_rows(start, stop))
+    if styled:
+        with timer.stage('着色', len(page_df)):
+            page_df = style_levels(page_df)
+    # Styler 的单元格样式在渲染时才生成，计入渲染阶段
+    with timer.stage('渲染', stop - start):
+        st.dataframe(page_df, use_container_width=True)
+
+def render_issue_report(issues: pd.DataFrame, valid_rows: int):
+    """显示上传文件的校验问题：跳过的行数、各类问题的数量、分页的问题明细和下载"""
+    skipped = issues['序号'].nunique()
+    st.warning(f"⚠️ 发现 {len(issues)} 处数据问题，{skipped} 行已跳过；其余 {valid_rows} 条记录正常计算")
+    
+    with st.expander("🧾 数据问题报告", expanded=False):
+        counts = issues['问题'].str.replace(r'^与第\d+条记录学号重复$', '学号重复', regex=True).value_counts()
+        st.write('，'.join(f"{problem} {count} 处" for problem, count in counts.items()))
+        render_paged_table('issues', len(issues), lambda start, stop: issues.iloc[start:stop])
+        st.download_button(
+            "📄 下载问题报告（CSV）",
+            # 带 BOM，Excel 打开时中文不乱码
+            data=issues.to_csv(index=False).encode('utf-8-sig'),
+            file_name="数据问题报告.csv",
+            mime="text/csv"
+        )
+
+def render_delta_report(moves: pd.DataFrame, cutoff_scores: dict):
+    """显示与上一次上传相比新增、删除、总分、排名或等级有变化的学生（等级按当前分数线）"""
+    st.subheader("🔀 与上一次上传相比")
+    moves = delta_levels(moves, cutoff_scores)
+    
+    changes = moves['变动'].value_counts()
+    level_changed = moves['等级变化'] != ''
+    for col, (label, count) in zip(st.columns(5), [
+        ("新增", changes.get(DELTA_ADDED, 0)),
+        ("删除", changes.get(DELTA_REMOVED, 0)),
+        ("总分变化", changes.get(DELTA_SCORE, 0)),
+        ("仅排名变化", changes.get(DELTA_RANK, 0)),
+        ("等级变化", int(level_changed.sum()))
+    ]):
+        col.metric(label, f"{count}人")
+    
+    if len(moves) == 0:
+        st.info("没有学生的总分或排名发生变化")
+    else:
+        only_levels = st.checkbox("只看等级变化的学生", key='delta_levels_only')
+        view = moves[level_changed] if only_levels else moves
+        render_paged_table('delta', len(view), lambda start, stop: view.iloc[start:stop])
+        st.download_button(
+            "📄 下载变动名单（CSV）",
+            # 名单可能很长（少数学生分数变化会使其后所有学生的排名变化），点击下载时才生成
+            data=lambda: view.to_csv(index=False).encode('utf-8-sig'),
+            file_name="成绩变动名单.csv",
+            mime="text/csv"
+        )
+    
+    if st.button("✖️ 关闭对比"):
+        st.session_state.pop('cohort_delta', None)
+        st.rerun()
+
+# 历史成绩库（可选）：设置环境变量 SCORE_HISTORY_DB 为数据库文件路径时启用，未设置时不保存任何数据
+HISTORY_DB_PATH = os.environ.get('SCORE_HISTORY_DB', '').strip()
+_history_store = None
+_history_lock = threading.Lock()
+
+def open_history_store() -> Optional[HistoryStore]:
+    """所有会话共享的历史成绩库，首次使用时打开；未启用时返回 None"""
+    global _history_store
+    if not HISTORY_DB_PATH:
+        return None
+    with _history_lock:
+        if _history_store is None:
+            _history_store = HistoryStore(HISTORY_DB_PATH)
+        return _history_store
+
+def render_history_save(store: HistoryStore, final_df: pd.DataFrame, cutoff_scores: dict, default_name: str):
+    """把当前结果（含等级和班内排名）作为一次考试保存到历史成绩库"""
+    with st.expander("🗂️ 保存到历史记录", expanded=False):
+        # 用表单避免输入考试名称时整页重新运行
+        with st.form('history_save_form'):
+            name = st.text_input("考试名称", value=default_name)
+            taken_at = st.date_input("考试日期")
+            replace = st.checkbox("覆盖同名考试", help="已有同名考试时替换其成绩")
+            submitted = st.form_submit_button("💾 保存")
+        if submitted:
+            try:
+                with st.spinner("正在保存..."):
+                    store.save_exam(name, final_df, taken_at, cutoff_scores, replace)
+            except ValueError as e:
+                st.error(f"❌ {str(e)}")
+            except sqlite3.Error as e:
+                st.error(f"❌ 保存到历史成绩库时出错：{str(e)}")
+            else:
+                st.success(f"✅ 已保存“{name.strip()}”，共 {len(final_df)} 条记录")
+
+def render_history(store: HistoryStore):
+    """历史成绩：学生历次考试的成绩走势、各班平均分走势和已保存考试的管理"""
+    st.subheader("🗂️ 历史成绩")
+    exams = store.exams()
+    if len(exams) == 0:
+        st.info("还没有保存的考试，计算结果后可在“💾 下载结果”下方保存到历史记录")
+        return
+    
+    tab_student, tab_class, tab_exams = st.tabs(["👤 学生走势", "🏫 班级走势", "🗃️ 考试管理"])
+    with tab_student:
+        student_id = st.text_input("学号", key='history_student_id')
+        if student_id.strip():
+            trend = store.student_trend(student_id)
+            if len(trend) == 0:
+                st.info("没有该学号的历史成绩")
+            else:
+                st.dataframe(trend, use_container_width=True, hide_index=True)
+                chart = trend.assign(日期=pd.to_datetime(trend['日期']))
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.write("**总分**")
+                    st.line_chart(chart, x='日期', y='总分')
+                with col2:
+                    st.write("**排名**")
+                    st.line_chart(chart, x='日期', y='排名')
+    
+    with tab_class:
+        selected_classes = st.multiselect("班级", store.classes(), key='history_classes')
+        progression = store.class_progression(selected_classes)
+        if len(progression):
+            means = progression.pivot_table(index='日期', columns='班级', values='平均分')
+            means.index = pd.to_datetime(means.index)
+            st.write("**平均分**")
+            st.line_chart(means)
+            st.dataframe(progression.round(1), use_container_width=True, hide_index=True)
+    
+    with tab_exams:
+        st.dataframe(exams, use_container_width=True, hide_index=True)
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            exam_name = st.selectbox("考试", exams['考试'], key='history_delete_exam')
+        with col2:
+            confirmed = st.checkbox("确认删除", key='history_delete_confirm')
+        if st.button("🗑️ 删除考试", disabled=not confirmed):
+            store.delete_exam(exam_name)
+            st.session_state.pop('history_delete_confirm', None)
+            st.rerun()
+
+# 结果表筛选和分页控件的会话状态键，上传新文件时重置
+RESULT_VIEW_KEYS = [
+    'filter_classes', 'filter_levels', 'filter_query',
+    'original_page', 'processed_page', 'final_page', 'issues_page', 'delta_page', 'delta_levels_only'
+]
+
 def main():
     st.set_page_config(
         page_title="学生成绩计算系统",
@@ -82,6 +1977,105 @@ def main():
         layout="wide"
     )
     
+    # 性能诊断开关在侧边栏底部，本次运行使用上一次运行时开关的值
+    profiling = st.session_state.get('profiling_enabled', PROFILE_DEFAULT)
+    if profiling:
+        configure_profile_logging()
+    timer = StageTimer(enabled=profiling, run_id=current_session_id())
+    
+    # 请求了性能分析时，用 cProfile 记录这一次运行
+    profiler = cProfile.Profile() if st.session_state.pop('profile_next_run', False) else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        render_page(timer)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            st.session_state['profile_report'] = format_profile(profiler)
+    
+    render_diagnostics(timer)
+
+def render_diagnostics(timer: StageTimer):
+    """侧边栏性能诊断：开关、本次运行各阶段的用时和行数，以及单次运行的 cProfile 分析报告"""
+    with st.sidebar.expander("⏱️ 性能诊断", expanded=timer.enabled):
+        st.toggle(
+            "记录各阶段用时",
+            value=PROFILE_DEFAULT,
+            key='profiling_enabled',
+            help="记录读取、计算、定级、着色、显示等阶段的用时，并输出到 score.profile 日志（环境变量 SCORE_PROFILE=1 时默认开启）"
+        )
+        
+        if timer.enabled:
+            if timer.records:
+                st.dataframe(timer.summary(), use_container_width=True, hide_index=True)
+                st.caption(f"本次运行合计 {timer.total_seconds * 1000:.1f} 毫秒（命中缓存的阶段不计时）")
+            for name, value in timer.notes.items():
+                st.write(f"{name}：{value}")
+        
+        if st.button("🔬 分析下一次运行（cProfile）"):
+            st.session_state['profile_next_run'] = True
+            st.rerun()
+        
+        report = st.session_state.get('profile_report')
+        if report:
+            st.download_button("📄 下载分析报告", data=report, file_name="profile.txt", mime="text/plain")
+            st.code(report, language=None)
+
+def render_schema_settings() -> ScoringSchema:
+    """侧边栏计分方案设置：编辑各部分的分数列、满分、权重和取整方式，返回当前使用的方案"""
+    schema = st.session_state.get('scoring_schema', DEFAULT_SCHEMA)
+    
+    with st.sidebar.expander("📐 计分方案", expanded=False):
+        st.caption(schema.describe())
+        
+        components = pd.DataFrame(
+            [(c.column, c.max_score, c.weight) for c in schema.components],
+            columns=['列名', '满分', '权重']
+        )
+        edited = st.data_editor(
+            components,
+            num_rows='dynamic',
+            hide_index=True,
+            key=f"schema_editor_{schema.key}",
+            column_config={
+                '列名': st.column_config.TextColumn('列名', required=True),
+                '满分': st.column_config.NumberColumn('满分', min_value=0.0, required=True),
+                '权重': st.column_config.NumberColumn('权重', min_value=0.0, max_value=1.0, step=0.05, required=True)
+            }
+        )
+        modes = list(ROUNDING_MODES)
+        rounding = st.selectbox(
+            "总分取整",
+            modes,
+            index=modes.index(schema.rounding),
+            format_func=lambda mode: ROUNDING_MODES[mode][0],
+            key=f"schema_rounding_{schema.key}"
+        )
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("✅ 应用方案", use_container_width=True):
+                try:
+                    rows = edited.dropna(how='all')
+                    new_schema = ScoringSchema(
+                        [ScoreComponent(row['列名'], row['满分'], row['权重']) for _, row in rows.iterrows()],
+                        rounding
+                    )
+                except (ValueError, TypeError) as e:
+                    st.error(f"❌ {str(e)}")
+                else:
+                    st.session_state['scoring_schema'] = new_schema
+                    st.rerun()
+        with col2:
+            if st.button("↩️ 默认方案", use_container_width=True):
+                st.session_state['scoring_schema'] = DEFAULT_SCHEMA
+                st.rerun()
+    
+    return schema
+
+def render_page(timer: StageTimer = NULL_TIMER):
+    """页面主体：设置、上传、计算结果和下载"""
     # 应用说明
     st.sidebar.markdown("## 📊 应用说明")
     st.sidebar.info("""
@@ -98,65 +2092,74 @@ def main():
     # 应用设置
     st.sidebar.header("⚙️ 应用设置")
     st.sidebar.info("上传Excel或CSV文件，系统将自动计算成绩和等级")
+    required_only = st.sidebar.checkbox(
+        "⚡ 仅读取必要列",
+        value=False,
+        help="只读取学生信息列和计分方案中的分数列，加快从教务系统导出的大文件的读取；结果中不包含其他列"
+    )
+    delta_mode = st.sidebar.toggle(
+        "🔁 增量更新",
+        value=True,
+        help="重新上传修改后的文件时，按学号与上一次的结果对比，只重新计算分数有变化和新增的行，并列出排名或等级有变化的学生"
+    )
+    schema = render_schema_settings()
+    required_text = '、'.join(schema.required_columns)
+    
+    try:
+        history = open_history_store()
+    except sqlite3.Error as e:
+        st.sidebar.error(f"❌ 无法打开历史成绩库 {HISTORY_DB_PATH}：{str(e)}")
+        history = None
     
     # 侧边栏：等级 cutoff 设置
     st.sidebar.header("🏆 等级 cutoff 设置")
-    default_cutoffs = {
-        'Level2': 47,
-        'Level3': 53,
-        'Level4': 58,
-        'Level5': 63,
-        'Level6': 66,
-        'Level7': 70
-    }
     
     if 'cutoffs' not in st.session_state:
-        st.session_state['cutoffs'] = default_cutoffs.copy()
+        st.session_state['cutoffs'] = DEFAULT_CUTOFFS.copy()
     
     # 等级分数线输入（使用直接输入，支持实时更新）
     st.sidebar.caption("请设置各等级的最低分数线（≥）。Level2到Level7递增。")
     
+    # 输入框的值保存在会话状态中：首次运行、恢复默认或按比例计算分数线后，在创建输入框之前同步为当前分数线
+    if st.session_state.pop('sync_cutoff_inputs', False) or 'level2_input' not in st.session_state:
+        for level in GRADE_LEVELS:
+            st.session_state[f"{level.lower()}_input"] = str(st.session_state['cutoffs'][level])
+    
     # 使用文本输入框，支持直接输入整数
     level2_input = st.sidebar.text_input(
         "Level2 ≥", 
-        value=str(st.session_state['cutoffs']['Level2']),
         help="输入0-100之间的整数",
         key="level2_input"
     )
     level3_input = st.sidebar.text_input(
         "Level3 ≥", 
-        value=str(st.session_state['cutoffs']['Level3']),
         help="输入0-100之间的整数",
         key="level3_input"
     )
     level4_input = st.sidebar.text_input(
         "Level4 ≥", 
-        value=str(st.session_state['cutoffs']['Level4']),
         help="输入0-100之间的整数",
         key="level4_input"
     )
     level5_input = st.sidebar.text_input(
         "Level5 ≥", 
-        value=str(st.session_state['cutoffs']['Level5']),
         help="输入0-100之间的整数",
         key="level5_input"
     )
     level6_input = st.sidebar.text_input(
         "Level6 ≥", 
-        value=str(st.session_state['cutoffs']['Level6']),
         help="输入0-100之间的整数",
         key="level6_input"
     )
     level7_input = st.sidebar.text_input(
         "Level7 ≥", 
-        value=str(st.session_state['cutoffs']['Level7']),
         help="输入0-100之间的整数",
         key="level7_input"
     )
     
     # 验证输入并更新session state
     inputs = [level2_input, level3_input, level4_input, level5_input, level6_input, level7_input]
-    levels = ['Level2', 'Level3', 'Level4', 'Level5', 'Level6', 'Level7']
+    levels = GRADE_LEVELS
     
     # 验证所有输入
     valid_inputs = True
@@ -185,7 +2188,8 @@ def main():
     
     with col_b:
         if st.sidebar.button("🔄 恢复默认等级"):
-            st.session_state['cutoffs'] = default_cutoffs.copy()
+            st.session_state['cutoffs'] = DEFAULT_CUTOFFS.copy()
+            st.session_state['sync_cutoff_inputs'] = True
             st.sidebar.success("已恢复默认等级设置")
             st.rerun()
     
@@ -196,113 +2200,206 @@ def main():
         for level, score in current_cutoffs.items():
             st.write(f"{level}: ≥ {score}分")
     
+    # 等级分布预览占位（读取上传文件后填充）
+    preview_container = st.sidebar.container()
+    quota_container = st.sidebar.container()
+    
     # 文件上传区域
     st.header("📁 文件上传")
     
     uploaded_file = st.file_uploader(
         "请上传Excel或CSV文件",
         type=['xlsx', 'xls', 'csv'],
-        help="文件应包含以下列：姓名、学号、班级、甲部分数、乙部分数"
+        help=f"文件应包含以下列：{required_text}"
     )
     
     # 检查是否有新文件上传
     if uploaded_file is not None:
-        # 检查文件是否改变（通过文件名和大小）
-        file_key = f"{uploaded_file.name}_{uploaded_file.size}"
+        # xlsx 文件包含多个工作表时选择要读取的工作表（工作表列表按文件ID缓存）
+        sheet_name = None
+        if uploaded_file.name.endswith('.xlsx'):
+            if st.session_state.get('sheet_list_file_id') != uploaded_file.file_id:
+                try:
+                    st.session_state['sheet_list'] = list_excel_sheets(uploaded_file.getvalue())
+                except Exception:
+                    st.session_state['sheet_list'] = []
+                st.session_state['sheet_list_file_id'] = uploaded_file.file_id
+            
+            sheets = st.session_state['sheet_list']
+            if len(sheets) > 1:
+                sheet_name = st.selectbox("选择工作表", sheets)
         
-        if 'current_file_key' not in st.session_state or st.session_state['current_file_key'] != file_key:
-            # 新文件上传，读取并存储数据
+        # 同一次上传的文件ID不变，仅在文件ID或读取方式变化时计算内容摘要并读取（缓存按内容命中）
+        upload_id = (uploaded_file.file_id, required_only, sheet_name, schema.key)
+        columns = [] if required_only else None
+        if st.session_state.get('current_upload_id') != upload_id:
+            # 上一次上传的结果（仍在缓存中时）用于增量计算和对比
+            previous = None
+            if delta_mode and st.session_state.get('current_file_key') is not None:
+                previous = cached_cohort(st.session_state['current_file_key'])
             try:
-                # 读取文件
-                if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(uploaded_file)
-                else:
-                    df = pd.read_excel(uploaded_file)
-                
-                # 处理None值，用0替代
-                df = df.fillna(0)
-                
-                # 检查必要列是否存在
-                required_columns = ['姓名', '学号', '班级', '甲部分数', '乙部分数']
-                missing_columns = [col for col in required_columns if col not in df.columns]
-                
-                if missing_columns:
-                    st.error(f"❌ 文件缺少必要的列：{', '.join(missing_columns)}")
-                    st.info("请确保文件包含以下列：姓名、学号、班级、甲部分数、乙部分数")
-                    return
-                
-                # 存储原始数据和处理后的数据到session state
-                st.session_state['original_df'] = df.copy()
-                st.session_state['processed_df'] = process_data(df)
-                st.session_state['current_file_key'] = file_key
-                
-                st.success(f"✅ 文件上传成功！共读取 {len(df)} 条记录")
-                
+                cohort = load_upload(uploaded_file.name, uploaded_file.getvalue(), columns, sheet_name, timer, schema, previous)
+            except MissingColumnsError as e:
+                st.error(f"❌ {str(e)}")
+                st.info(f"请确保文件包含以下列：{required_text}")
+                return
             except Exception as e:
                 st.error(f"❌ 读取文件时出错：{str(e)}")
                 return
+            
+            session_budget = SESSION_MEMORY_BUDGET_MB * 1024 * 1024
+            if cohort.nbytes() > session_budget:
+                _upload_cache.pop(cohort.key)
+                st.error(f"❌ 文件数据占用 {cohort.nbytes() / 1024 / 1024:.1f} MB，超过单个会话的内存上限 {SESSION_MEMORY_BUDGET_MB:g} MB")
+                st.info("请勾选侧边栏的“仅读取必要列”，或拆分文件后分别上传")
+                return
+            
+            if st.session_state.get('current_file_key') != cohort.key:
+                # 新文件上传：会话只保存缓存键，数据由所有会话共享的缓存持有，可按内存预算释放
+                st.session_state['current_file_key'] = cohort.key
+                st.session_state['export_keys'] = []
+                for key in RESULT_VIEW_KEYS:
+                    st.session_state.pop(key, None)
+                if previous is not None:
+                    with timer.stage('上传对比', len(cohort.processed_df)):
+                        st.session_state['cohort_delta'] = compare_cohorts(previous, cohort)
+                else:
+                    st.session_state.pop('cohort_delta', None)
+                
+                row_count = len(cohort.processed_df)
+                st.success(f"✅ 文件上传成功！共读取 {row_count} 条记录")
+                if cohort.read_seconds > 0:
+                    st.caption(f"⏱️ 解析用时 {cohort.read_seconds:.2f} 秒，约 {row_count / cohort.read_seconds:,.0f} 行/秒")
+            
+            st.session_state['current_upload_id'] = upload_id
+    
+    # 按缓存键取出本会话的数据；已被内存预算释放时从上传控件中的文件重新读取
+    cohort = None
+    if st.session_state.get('current_file_key') is not None:
+        cohort = cached_cohort(st.session_state['current_file_key'])
+        if cohort is None and uploaded_file is not None:
+            with st.spinner("数据已被释放以节省内存，正在重新读取..."):
+                cohort = load_upload(uploaded_file.name, uploaded_file.getvalue(), columns, sheet_name, timer, schema)
+        if cohort is None:
+            st.warning("⚠️ 数据已因长时间未操作被释放，请重新上传文件")
+            st.session_state['current_file_key'] = None
+    
+    # 登记本会话正在使用的缓存条目，超出单会话预算时释放较早的导出文件
+    export_keys = st.session_state.get('export_keys', [])
+    if cohort is not None:
+        export_keys = trim_session_exports(cohort.key, export_keys)
+        st.session_state['export_keys'] = export_keys
+    session_id = current_session_id()
+    if session_id is not None:
+        _sessions.touch(session_id, cohort.key if cohort is not None else None, export_keys)
+    
+    # 上传缓存状态
+    with st.sidebar.expander("🗄️ 缓存状态", expanded=False):
+        stats = upload_cache_stats()
+        st.write(f"命中：{stats['hits']} 次，未命中：{stats['misses']} 次")
+        st.write(f"已缓存文件：{stats['entries']} / {stats['max_entries']}")
+        if stats['pending']:
+            st.write(f"正在解析：{stats['pending']} 个文件")
+        if cohort is not None:
+            sharing = _sessions.cohort_refcounts()[cohort.key]
+            if sharing > 1:
+                st.caption(f"当前文件由 {sharing} 个会话共享同一份数据")
+    
+    # 本会话数据占用的内存及所有会话共享缓存的总占用
+    with st.sidebar.expander("🧠 内存占用", expanded=False):
+        report = session_memory_report(st.session_state, cohort)
+        report['导出文件'] = sum(_export_cache.size_of(key) for key in export_keys)
+        for name, nbytes in report.items():
+            st.write(f"{name}：{nbytes / 1024 / 1024:.2f} MB")
+        st.write(f"**合计：{sum(report.values()) / 1024 / 1024:.2f} MB** / {SESSION_MEMORY_BUDGET_MB:.0f} MB")
+        st.caption(f"所有会话共享缓存：{cache_memory_bytes() / 1024 / 1024:.1f} MB / {GLOBAL_MEMORY_BUDGET_MB:.0f} MB，活跃会话 {len(_sessions)} 个")
+    
+    # 等级分布预览：按输入框中尚未应用的分数线，直接在总分分布上查表
+    if valid_inputs and cohort is not None:
+        distribution = cohort.distribution
+        pending_cutoffs = {level: validate_cutoff_input(inputs[i]) for i, level in enumerate(levels)}
+        pending_counts = distribution.level_counts(pending_cutoffs)
+        
+        with preview_container.expander("👀 等级分布预览", expanded=pending_cutoffs != current_cutoffs):
+            if pending_cutoffs != current_cutoffs:
+                st.caption("按输入框中的分数线预览（尚未应用）")
+            for level in reversed(GRADE_DTYPE.categories):
+                count = pending_counts[level]
+                if count > 0:
+                    st.write(f"{level}: {count}人（{count / distribution.total * 100:.1f}%）")
+    
+    # 按比例计算分数线：只在总分分布上查表，不逐行重新定级
+    if cohort is not None:
+        render_quota_solver(quota_container, cohort.distribution)
     
     # 如果有数据，显示结果
-    if 'processed_df' in st.session_state and st.session_state['processed_df'] is not None:
-        df = st.session_state['original_df']
-        processed_df = st.session_state['processed_df']
+    if cohort is not None:
+        processed_df = cohort.processed_df
+        distribution = cohort.distribution
         
-        # 显示原始数据
-        st.subheader("📋 原始数据")
-        st.dataframe(df, use_container_width=True)
+        # 有问题的行未参与计算，列出问题供修改后重新上传
+        if len(cohort.issues):
+            render_issue_report(cohort.issues, len(processed_df))
+        
+        # 重新上传修改后的文件时，列出排名或等级有变化的学生
+        if st.session_state.get('cohort_delta') is not None:
+            render_delta_report(st.session_state['cohort_delta'], current_cutoffs)
+        
+        # 显示原始数据（默认折叠，分页显示）
+        with st.expander("📋 原始数据", expanded=False):
+            render_paged_table('original', len(processed_df), cohort.original_rows, timer=timer)
         
         # 显示处理后的数据
         st.subheader("📊 计算结果")
-        st.dataframe(processed_df, use_container_width=True)
+        render_paged_table('processed', len(processed_df), lambda start, stop: processed_df.iloc[start:stop], timer=timer)
+        
+        # 全体和各班统计由缓存的班级直方图得到（每个文件只统计一次）
+        with timer.stage('班级统计', len(processed_df)):
+            analytics = cohort.analytics
+            overall = analytics.overall()
+            class_summary = analytics.summary()
         
-        # 调试信息
-        st.info(f"📝 数据检查：总分范围 {processed_df['总分'].min()} - {processed_df['总分'].max()}")
+        # 诊断信息（显示在侧边栏的性能诊断中）
+        timer.note('总分范围', f"{overall['最低分']:g} - {overall['最高分']:g}")
         
         # 统计信息
         col1, col2, col3, col4 = st.columns(4)
         with col1:
             st.metric("总人数", len(processed_df))
         with col2:
-            st.metric("平均分", f"{processed_df['总分'].mean():.1f}")
+            st.metric("平均分", f"{overall['平均分']:.1f}")
         with col3:
-            st.metric("最高分", f"{processed_df['总分'].max()}")
+            st.metric("最高分", f"{overall['最高分']:g}")
         with col4:
-            st.metric("最低分", f"{processed_df['总分'].min()}")
+            st.metric("最低分", f"{overall['最低分']:g}")
         
-        # 等级划分（使用当前cutoffs）
-        final_df = assign_grades(processed_df, current_cutoffs)
+        # 各等级人数直接由总分分布查表得到，无需逐行分配等级
+        level_counts = {level: count for level, count in distribution.level_counts(current_cutoffs).items() if count > 0}
         
-        # 调试等级分配
-        level_counts = final_df['等级'].value_counts()
-        st.info(f"📊 等级分配：{dict(level_counts)}")
+        timer.note('等级分配', level_counts)
         
-        # 显示最终结果（按等级涂色）
-        st.subheader("🎯 最终结果（含等级）")
-        
-        # 定义等级颜色映射
-        level_colors = {
-            'Level2': '#FFE6E6',  # 浅红色
-            'Level3': '#FFF2E6',  # 浅橙色
-            'Level4': '#FFFFE6',  # 浅黄色
-            'Level5': '#E6FFE6',  # 浅绿色
-            'Level6': '#E6F3FF',  # 浅蓝色
-            'Level7': '#F0E6FF',  # 浅紫色
-            '未定级': '#F5F5F5'   # 浅灰色
-        }
+        # 等级划分（使用当前cutoffs），仅在显示和导出结果表时逐行生成等级
+        with timer.stage('定级', len(processed_df)):
+            final_df = assign_grades(processed_df, current_cutoffs)
+            final_df['班内排名'] = analytics.class_rank_column()
         
-        # 创建样式函数
-        def highlight_levels(df):
-            styles = pd.DataFrame('', index=df.index, columns=df.columns)
-            for i in range(len(df)):
-                level = df.iloc[i]['等级']
-                color = level_colors.get(level, '#F5F5F5')
-                for j in range(len(df.columns)):
-                    styles.iloc[i, j] = f'background-color: {color}'
-            return styles
+        # 显示最终结果（按等级涂色）：在服务器端筛选，只发送当前页
+        st.subheader("🎯 最终结果（含等级）")
+        col_class, col_level, col_search = st.columns(3)
+        with col_class:
+            selected_classes = st.multiselect(
+                "班级",
+                list(processed_df['班级'].astype('category').cat.categories),
+                key='filter_classes'
+            )
+        with col_level:
+            selected_levels = st.multiselect("等级", list(reversed(GRADE_DTYPE.categories)), key='filter_levels')
+        with col_search:
+            query = st.text_input("搜索学号或姓名", key='filter_query')
         
-        # 应用样式并显示
-        styled_df = final_df.style.apply(highlight_levels, axis=None)
-        st.dataframe(styled_df, use_container_width=True)
+        with timer.stage('筛选', len(final_df)):
+            filtered_df = filter_results(final_df, selected_classes, selected_levels, query)
+        render_paged_table('final', len(filtered_df), lambda start, stop: filtered_df.iloc[start:stop], styled=True, timer=timer)
         
         # 成绩分布统计
         st.subheader("📊 成绩分布")
@@ -311,37 +2408,17 @@ def main():
         col1, col2 = st.columns(2)
         with col1:
             st.write("**🏆 等级分布**")
-            grade_counts = final_df['等级'].value_counts().sort_index()
             
             # 创建等级分布表格
-            grade_data = []
-            for level, count in grade_counts.items():
-                percentage = (count / len(final_df)) * 100
-                
-                # 根据等级添加图标
-                if level == 'Level7':
-                    icon = "🥇"
-                elif level == 'Level6':
-                    icon = "🥈"
-                elif level == 'Level5':
-                    icon = "🥉"
-                elif level == 'Level4':
-                    icon = "🏅"
-                elif level == 'Level3':
-                    icon = "🎖️"
-                elif level == 'Level2':
-                    icon = "📊"
-                else:
-                    icon = "❓"
-                
-                grade_data.append({
-                    "等级": f"{icon} {level}",
-                    "人数": f"{count}人",
-                    "占比": f"{percentage:.1f}%"
-                })
+            level_series = pd.Series(level_counts, dtype=np.int64)
+            level_names = level_series.index.to_series()
+            grade_df = pd.DataFrame({
+                "等级": level_names.map(LEVEL_ICONS).fillna("❓") + " " + level_names,
+                "人数": level_series.astype(str) + "人",
+                "占比": (level_series / distribution.total * 100).map("{:.1f}%".format)
+            })
             
             # 显示等级分布表格
-            grade_df = pd.DataFrame(grade_data)
             st.dataframe(
                 grade_df,
                 use_container_width=True,
@@ -355,32 +2432,16 @@ def main():
         
         with col2:
             st.write("**🏫 班级平均分**")
-            class_avg = final_df.groupby('班级')['总分'].mean().sort_values(ascending=False)
             
-            # 创建班级平均分表格
-            class_avg_data = []
-            for class_name, avg_score in class_avg.items():
-                # 根据平均分添加颜色和图标
-                if avg_score >= 80:
-                    icon = "🥇"
-                    color = "green"
-                elif avg_score >= 70:
-                    icon = "🥈"
-                    color = "blue"
-                elif avg_score >= 60:
-                    icon = "🥉"
-                    color = "orange"
-                else:
-                    icon = "📊"
-                    color = "red"
-                
-                class_avg_data.append({
-                    "班级": f"{icon} {class_name}",
-                    "平均分": f"{avg_score:.1f}分"
-                })
+            # 创建班级平均分表格（按平均分添加图标）
+            class_avg = class_summary['平均分']
+            icons = np.select([class_avg >= 80, class_avg >= 70, class_avg >= 60], ["🥇", "🥈", "🥉"], default="📊")
+            class_avg_df = pd.DataFrame({
+                "班级": icons + " " + class_summary.index.astype(str),
+                "平均分": class_avg.map("{:.1f}分".format).to_numpy()
+            })
             
             # 显示班级平均分表格
-            class_avg_df = pd.DataFrame(class_avg_data)
             st.dataframe(
                 class_avg_df,
                 use_container_width=True,
@@ -391,60 +2452,31 @@ def main():
                 }
             )
         
+        # 各班详细统计和等级交叉表
+        st.subheader("🏫 班级统计")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**📈 各班分数统计**")
+            st.dataframe(class_summary.round(1), use_container_width=True)
+        with col2:
+            st.write("**🧮 班级×等级人数**")
+            crosstab = analytics.crosstab(current_cutoffs)
+            st.dataframe(crosstab.loc[:, crosstab.sum() > 0], use_container_width=True)
+        
+        # 多组分数线方案对比（在总分分布上一次算出）
+        render_scenario_panel(distribution, current_cutoffs)
+        
         # 移除分数区间统计
         
         # 下载结果
         st.subheader("💾 下载结果")
         
-        # 创建Excel文件（带颜色）
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            final_df.to_excel(writer, sheet_name='计算结果', index=False)
-            
-            # 获取workbook和worksheet对象
-            workbook = writer.book
-            worksheet = writer.sheets['计算结果']
-            
-            # 定义等级颜色映射（openpyxl格式）
-            from openpyxl.styles import PatternFill
-            level_fills = {
-                'Level2': PatternFill(start_color='FFE6E6', end_color='FFE6E6', fill_type='solid'),
-                'Level3': PatternFill(start_color='FFF2E6', end_color='FFF2E6', fill_type='solid'),
-                'Level4': PatternFill(start_color='FFFFE6', end_color='FFFFE6', fill_type='solid'),
-                'Level5': PatternFill(start_color='E6FFE6', end_color='E6FFE6', fill_type='solid'),
-                'Level6': PatternFill(start_color='E6F3FF', end_color='E6F3FF', fill_type='solid'),
-                'Level7': PatternFill(start_color='F0E6FF', end_color='F0E6FF', fill_type='solid'),
-                '未定级': PatternFill(start_color='F5F5F5', end_color='F5F5F5', fill_type='solid')
-            }
-            
-            # 应用颜色到等级列
-            level_col_index = final_df.columns.get_loc('等级') + 1  # Excel列从1开始
-            for row_idx, level in enumerate(final_df['等级'], start=2):  # Excel行从2开始（跳过标题）
-                if level in level_fills:
-                    for col_idx in range(1, len(final_df.columns) + 1):
-                        cell = worksheet.cell(row=row_idx, column=col_idx)
-                        cell.fill = level_fills[level]
-            
-            # 设置列宽
-            for col_idx, col_name in enumerate(final_df.columns, start=1):
-                max_len = max(
-                    final_df[col_name].astype(str).apply(len).max(),
-                    len(col_name)
-                )
-                worksheet.column_dimensions[chr(64 + col_idx)].width = max_len + 2
+        # 按需在后台生成Excel文件（带颜色），相同数据和分数线的结果直接复用
+        render_export_panel(cohort, current_cutoffs, timer)
         
-        output.seek(0)
-        
-        # 生成文件名
-        timestamp = int(time.time())
-        filename = f"成绩计算结果_{timestamp}.xlsx"
-        
-        st.download_button(
-            label="📥 下载Excel文件",
-            data=output.getvalue(),
-            file_name=filename,
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        if history is not None:
+            default_name = os.path.splitext(uploaded_file.name)[0] if uploaded_file is not None else ''
+            render_history_save(history, final_df, current_cutoffs, default_name)
     
     else:
         st.info("👆 请上传包含学生成绩的Excel或CSV文件")
@@ -454,16 +2486,17 @@ def main():
         example_data = {
             '姓名': ['张三', '李四', '王五'],
             '学号': ['2021001', '2021002', '2021003'],
-            '班级': ['一班', '一班', '二班'],
-            '甲部分数': [45, 42, 48],
-            '乙部分数': [95, 88, 92]
+            '班级': ['一班', '一班', '二班']
         }
+        for c in schema.components:
+            example_data[c.column] = [round(c.max_score * ratio) for ratio in (0.9, 0.85, 0.95)]
         example_df = pd.DataFrame(example_data)
         st.dataframe(example_df, use_container_width=True)
         
-        st.markdown("""
+        st.markdown(f"""
         **计算规则：**
-        - 总分 = (乙部分数/103 × 0.7) × 100 + (甲部分数/50 × 0.3) × 100
+        - {schema.describe()}
+        - 可在侧边栏“📐 计分方案”中修改分数列、满分、权重和取整方式
         - 系统会自动按总分降序排序并计算排名
         - 您可以根据需要设置各等级的cutoff分数
         """)
@@ -478,6 +2511,10 @@ def main():
         4. **查看结果**：系统自动计算并显示结果
         5. **下载文件**：导出带颜色标记的Excel文件
         """)
+    
+    # 历史成绩（启用历史成绩库时显示）
+    if history is not None:
+        render_history(history)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+批量计算成绩（命令行）
+
+读取目录或通配符匹配的多个 Excel/CSV 文件，在进程池中并行完成
+读取 → 计算总分和排名 → 分配等级 → 导出带颜色的Excel，并输出每个文件的用时。
+
+用法示例：
+    python batch_grade.py 期末成绩/ --cutoffs cutoffs.json
+    python batch_grade.py "期末成绩/*.xlsx" "补考/*.csv" --merge-rank -o 结果
+    python batch_grade.py 期末成绩/ --schema schema.json   # 自定义计分方案
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from app_cloud_safe import (
+    DEFAULT_CUTOFFS, DEFAULT_SCHEMA, GRADE_LEVELS, ScoringSchema, assign_grades, export_results_excel,
+    process_data, read_upload, validate_cutoff_input
+)
+
+# 支持的文件类型
+SUPPORTED_SUFFIXES = ('.xlsx', '.xls', '.csv')
+
+# 合并排名时记录来源文件的列
+SOURCE_COLUMN = '来源文件'
+
+def collect_files(patterns: list) -> list:
+    """展开目录和通配符，返回去重排序后的成绩文件列表"""
+    files = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            candidates = path.iterdir()
+        else:
+            candidates = (Path(p) for p in glob.glob(pattern, recursive=True))
+        for candidate in candidates:
+            # 跳过 Excel 打开文件时产生的临时文件
+            if candidate.is_file() and candidate.suffix.lower() in SUPPORTED_SUFFIXES and not candidate.name.startswith('~$'):
+                files.add(candidate)
+    return sorted(files)
+
+def load_cutoffs(path: str = None) -> dict:
+    """读取等级分数线配置（JSON，如 {"Level2": 47, ...}），未配置的等级使用默认分数线"""
+    cutoffs = DEFAULT_CUTOFFS.copy()
+    if path is None:
+        return cutoffs
+    
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    
+    for level, value in config.items():
+        if level not in GRADE_LEVELS:
+            raise ValueError(f"未知的等级：{level}")
+        score = validate_cutoff_input(str(value))
+        if score is None:
+            raise ValueError(f"{level} 分数线无效，请输入0-100之间的整数")
+        cutoffs[level] = score
+    return cutoffs
+
+def load_schema(path: str = None) -> ScoringSchema:
+    """读取计分方案配置（JSON，如 {"components": [{"column": "甲部分数", "max_score": 50, "weight": 0.3}, ...],
+    "rounding": "half_even"}），未指定时使用默认方案"""
+    if path is None:
+        return DEFAULT_SCHEMA
+    
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    try:
+        return ScoringSchema.from_dict(config)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"计分方案格式错误：{str(e)}")
+
+def grade_file(path: Path, cutoffs: dict, output_dir: Path, required_only: bool = False,
+               keep_result: bool = False, schema: ScoringSchema = DEFAULT_SCHEMA) -> dict:
+    """处理单个文件并导出结果，返回各阶段用时（在子进程中运行）"""
+    timings = {}
+    
+    start = time.perf_counter()
+    df, issues = read_upload(path.name.lower(), path.read_bytes(), [] if required_only else None, schema=schema)
+    timings['读取'] = time.perf_counter() - start
+    
+    # 有问题的行不参与计算，问题明细与结果一起导出（带 BOM，Excel 打开时中文不乱码）
+    issues_path = None
+    if len(issues):
+        issues_path = output_dir / f"{path.stem}_数据问题报告.csv"
+        issues.to_csv(issues_path, index=False, encoding='utf-8-sig')
+    
+    start = time.perf_counter()
+    processed_df = process_data(df, schema=schema)
+    timings['计算'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    final_df = assign_grades(processed_df, cutoffs)
+    timings['定级'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    output_path = output_dir / f"{path.stem}_成绩计算结果.xlsx"
+    output_path.write_bytes(export_results_excel(final_df))
+    timings['导出'] = time.perf_counter() - start
+    
+    return {
+        'file': path,
+        'rows': len(final_df),
+        'output': output_path,
+        'issues': len(issues),
+        'issues_output': issues_path,
+        'timings': timings,
+        # 合并排名时才把计算结果传回主进程
+        'processed_df': processed_df if keep_result else None
+    }
+
+def merge_rankings(results: list, cutoffs: dict, schema: ScoringSchema = DEFAULT_SCHEMA) -> pd.DataFrame:
+    """合并各文件的计算结果，按总分重新计算跨文件排名和等级"""
+    frames = []
+    for result in results:
+        frame = result['processed_df'].drop(columns=['总分']).rename(columns={'排名': '文件内排名'})
+        frame.insert(0, SOURCE_COLUMN, result['file'].name)
+        frames.append(frame)
+    
+    merged_df = pd.concat(frames, ignore_index=True)
+    return assign_grades(process_data(merged_df, schema=schema), cutoffs)
+
+def run_batch(files: list, cutoffs: dict, output_dir: Path, workers: int = None,
+              merge_rank: bool = False, required_only: bool = False,
+              schema: ScoringSchema = DEFAULT_SCHEMA) -> tuple:
+    """在进程池中并行处理所有文件，返回 (成功结果列表, 失败列表[(文件, 错误信息)])"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results, failures = [], []
+    
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {
+            executor.submit(grade_file, path, cutoffs, output_dir, required_only, merge_rank, schema): path
+            for path in files
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                failures.append((path, str(e)))
+    
+    results.sort(key=lambda result: result['file'])
+    failures.sort()
+    return results, failures
+
+def print_summary(results: list, failures: list, elapsed: float):
+    """输出每个文件的行数和各阶段用时"""
+    stages = ['读取', '计算', '定级', '导出']
+    print(f"\n{'文件':<30}{'行数':>10}" + ''.join(f"{stage:>8}" for stage in stages) + f"{'合计':>8}")
+    for result in results:
+        timings = result['timings']
+        print(
+            f"{result['file'].name:<30}{result['rows']:>10}"
+            + ''.join(f"{timings[stage]:>8.2f}" for stage in stages)
+            + f"{sum(timings.values()):>8.2f}"
+        )
+    
+    for result in results:
+        if result['issues']:
+            print(f"⚠️ {result['file'].name}: {result['issues']} 处数据问题，有问题的行已跳过，详见 {result['issues_output']}")
+    
+    for path, error in failures:
+        print(f"❌ {path.name}: {error}")
+    
+    total_rows = sum(result['rows'] for result in results)
+    print(f"\n✅ 成功 {len(results)} 个文件，共 {total_rows} 条记录；失败 {len(failures)} 个；总用时 {elapsed:.2f} 秒")
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="批量计算学生成绩并导出带等级颜色的Excel文件")
+    parser.add_argument('inputs', nargs='+', help="成绩文件所在目录，或文件通配符（如 \"成绩/*.xlsx\"）")
+    parser.add_argument('-c', '--cutoffs', help="等级分数线配置文件（JSON），未指定时使用默认分数线")
+    parser.add_argument('-o', '--output-dir', default='成绩计算结果', help="结果输出目录（默认：成绩计算结果）")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="并行进程数（默认：CPU核数）")
+    parser.add_argument('--merge-rank', action='store_true', help="另外导出所有文件合并后的跨文件排名")
+    parser.add_argument('--required-only', action='store_true', help="只读取必要列，结果中不包含其他列")
+    parser.add_argument('-s', '--schema', help="计分方案配置文件（JSON），未指定时使用默认的甲乙两部分方案")
+    args = parser.parse_args(argv)
+    
+    try:
+        cutoffs = load_cutoffs(args.cutoffs)
+    except (OSError, ValueError) as e:
+        print(f"❌ 读取分数线配置出错：{str(e)}")
+        return 2
+    
+    try:
+        schema = load_schema(args.schema)
+    except (OSError, ValueError) as e:
+        print(f"❌ 读取计分方案出错：{str(e)}")
+        return 2
+    
+    files = collect_files(args.inputs)
+    if not files:
+        print("❌ 没有找到 Excel 或 CSV 文件")
+        return 2
+    
+    output_dir = Path(args.output_dir)
+    print(f"📁 共找到 {len(files)} 个文件，结果保存到 {output_dir}")
+    
+    start = time.perf_counter()
+    results, failures = run_batch(files, cutoffs, output_dir, args.workers, args.merge_rank, args.required_only, schema)
+    
+    if args.merge_rank and results:
+        merged_df = merge_rankings(results, cutoffs, schema)
+        merged_path = output_dir / "合并排名_成绩计算结果.xlsx"
+        merged_path.write_bytes(export_results_excel(merged_df))
+        print(f"🏆 合并排名已导出：{merged_path}（{len(merged_df)} 条记录）")
+    
+    print_summary(results, failures, time.perf_counter() - start)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+成绩计算流程性能基准测试
+
+用 generate_sample_data 生成不同规模的数据，分别测量读取、计算总分和排名、分配等级、
+着色和导出Excel各阶段的用时及峰值内存，并与保存的基准结果比较，变慢超过容差时返回非0。
+
+用法示例：
+    python benchmark.py                        # 默认规模 1k、100k、1M
+    python benchmark.py --sizes 1000 100000 --save-baseline
+    python benchmark.py --tolerance 0.3        # 与基准比较，超出 30% 视为变慢
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from app_cloud_safe import DEFAULT_CUTOFFS, assign_grades, export_results_excel, level_styles, process_data, read_upload
+from sample_data import generate_sample_data
+
+# 默认测试规模
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+
+# 测试的阶段（按流程顺序）
+STAGES = ['读取', '计算', '定级', '着色', '导出']
+
+# 默认基准结果文件
+DEFAULT_BASELINE = Path(__file__).with_name('benchmark_baseline.json')
+
+# 与基准比较的默认容差（相对值），以及忽略的绝对差异（秒 / MB），避免小规模数据的计时抖动
+DEFAULT_TOLERANCE = 0.25
+MIN_SECONDS_DELTA = 0.05
+MIN_MEMORY_DELTA_MB = 1.0
+
+def measure(func, trace_memory: bool = True) -> tuple:
+    """运行 func，返回 (结果, 用时秒数, 峰值内存MB)"""
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        seconds = time.perf_counter() - start
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024 if trace_memory else 0.0
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, seconds, peak_mb
+
+def benchmark_size(num_students: int, stages: list = STAGES, trace_memory: bool = True) -> dict:
+    """测试一种规模下各阶段的用时和峰值内存，返回 {阶段: {'seconds': ..., 'peak_mb': ...}}"""
+    buffer = io.BytesIO()
+    generate_sample_data(num_students).to_csv(buffer, index=False)
+    csv_data = buffer.getvalue()
+    
+    steps = {
+        '读取': lambda inputs: read_upload('benchmark.csv', csv_data)[0],
+        '计算': lambda inputs: process_data(inputs['读取']),
+        '定级': lambda inputs: assign_grades(inputs['计算'], DEFAULT_CUTOFFS),
+        '着色': lambda inputs: level_styles(inputs['定级']),
+        '导出': lambda inputs: export_results_excel(inputs['定级'])
+    }
+    
+    # 前面的阶段即使不计入结果也要运行，为后面的阶段准备输入
+    last_stage = max(STAGES.index(stage) for stage in stages)
+    outputs, results = {}, {}
+    for stage in STAGES[:last_stage + 1]:
+        outputs[stage], seconds, peak_mb = measure(lambda: steps[stage](outputs), trace_memory)
+        if stage in stages:
+            results[stage] = {'seconds': seconds, 'peak_mb': peak_mb}
+    return results
+
+def run_benchmark(sizes: list = DEFAULT_SIZES, stages: list = STAGES, trace_memory: bool = True) -> dict:
+    """测试所有规模，返回 {'规模/阶段': {'seconds': ..., 'peak_mb': ...}}"""
+    results = {}
+    for num_students in sizes:
+        print(f"⏱️ 测试 {num_students} 条记录...")
+        for stage, result in benchmark_size(num_students, stages, trace_memory).items():
+            results[f"{num_students}/{stage}"] = result
+            print(f"  {stage}: {result['seconds']:.3f} 秒，峰值内存 {result['peak_mb']:.1f} MB")
+    return results
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """与基准结果比较，返回变慢或内存增加超出容差的项目说明"""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        
+        seconds_limit = max(base['seconds'] * (1 + tolerance), base['seconds'] + MIN_SECONDS_DELTA)
+        if result['seconds'] > seconds_limit:
+            regressions.append(f"{key} 用时 {result['seconds']:.3f} 秒，基准 {base['seconds']:.3f} 秒")
+        
+        memory_limit = max(base['peak_mb'] * (1 + tolerance), base['peak_mb'] + MIN_MEMORY_DELTA_MB)
+        if base['peak_mb'] > 0 and result['peak_mb'] > memory_limit:
+            regressions.append(f"{key} 峰值内存 {result['peak_mb']:.1f} MB，基准 {base['peak_mb']:.1f} MB")
+    return regressions
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="成绩计算流程性能基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="测试的记录数（默认：1000 100000 1000000）")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help="测试的阶段（默认：全部）")
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE, help="基准结果文件（默认：benchmark_baseline.json）")
+    parser.add_argument('--save-baseline', action='store_true', help="把本次结果保存为基准（与已有基准合并）")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="允许的相对变慢比例（默认：0.25）")
+    parser.add_argument('--no-memory', action='store_true', help="不统计峰值内存（tracemalloc 会增加部分阶段的用时）")
+    args = parser.parse_args(argv)
+    
+    results = run_benchmark(args.sizes, args.stages, trace_memory=not args.no_memory)
+    
+    baseline = json.loads(args.baseline.read_text(encoding='utf-8')) if args.baseline.exists() else {}
+    
+    if args.save_baseline:
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"💾 基准结果已保存到 {args.baseline}")
+        return 0
+    
+    if not baseline:
+        print("ℹ️ 没有基准结果，使用 --save-baseline 保存本次结果作为基准")
+        return 0
+    
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("❌ 性能低于基准：")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    
+    print("✅ 所有项目均未低于基准")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
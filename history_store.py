@@ -0,0 +1,242 @@
+"""
+历史成绩库（可选）
+
+把每次定级后的成绩（assign_grades 的结果）作为一次考试保存到本地 SQLite 数据库，
+用于查询学生在多次考试中的成绩走势和各班历次考试的统计。
+
+- results 表以 (学号, 考试) 为主键（WITHOUT ROWID，按学号聚集存储），查询一个学生的历次成绩只读取相邻的几行
+- class_stats 表在保存考试时写入各班人数、平均分等汇总，以 (班级, 考试) 为主键，班级走势不需要扫描成绩明细
+- results 表另按考试建索引，删除一次考试时不扫描全表
+- 每次考试在一个事务中用 executemany 按学号顺序批量写入，查询使用固定的参数化语句（由 sqlite3 缓存预编译结果）
+
+用法示例：
+    store = HistoryStore('成绩历史.db')
+    store.save_exam('期中考试', graded_df, taken_at='2024-11-05', cutoffs=cutoffs)
+    store.student_trend('20240001')
+    store.class_progression(['一班', '二班'])
+"""
+
+import json
+import sqlite3
+import threading
+from itertools import repeat
+from datetime import date, datetime
+from typing import Optional
+
+import pandas as pd
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS exams (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    taken_at TEXT NOT NULL,
+    saved_at TEXT NOT NULL,
+    students INTEGER NOT NULL,
+    cutoffs TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_exams_taken_at ON exams (taken_at, id);
+
+CREATE TABLE IF NOT EXISTS results (
+    student_id TEXT NOT NULL,
+    exam_id INTEGER NOT NULL REFERENCES exams (id) ON DELETE CASCADE,
+    name TEXT,
+    class_name TEXT,
+    total REAL NOT NULL,
+    rank INTEGER NOT NULL,
+    class_rank INTEGER,
+    level TEXT,
+    PRIMARY KEY (student_id, exam_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_results_exam ON results (exam_id);
+
+CREATE TABLE IF NOT EXISTS class_stats (
+    exam_id INTEGER NOT NULL REFERENCES exams (id) ON DELETE CASCADE,
+    class_name TEXT NOT NULL,
+    students INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    max REAL NOT NULL,
+    min REAL NOT NULL,
+    level_counts TEXT NOT NULL,
+    PRIMARY KEY (class_name, exam_id)
+) WITHOUT ROWID;
+"""
+
+INSERT_EXAM_SQL = "INSERT INTO exams (name, taken_at, saved_at, students, cutoffs) VALUES (?, ?, ?, ?, ?)"
+INSERT_RESULT_SQL = (
+    "INSERT INTO results (student_id, exam_id, name, class_name, total, rank, class_rank, level) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_CLASS_STATS_SQL = (
+    "INSERT INTO class_stats (exam_id, class_name, students, mean, max, min, level_counts) VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+STUDENT_TREND_SQL = """
+SELECT e.name, e.taken_at, r.name, r.class_name, r.total, r.rank, r.class_rank, r.level, e.students
+FROM results AS r JOIN exams AS e ON e.id = r.exam_id
+WHERE r.student_id = ?
+ORDER BY e.taken_at, e.id
+"""
+
+CLASS_PROGRESSION_SQL = """
+SELECT e.name, e.taken_at, c.class_name, c.students, c.mean, c.max, c.min, c.level_counts
+FROM class_stats AS c JOIN exams AS e ON e.id = c.exam_id
+{where}
+ORDER BY e.taken_at, e.id, c.class_name
+"""
+
+# 查询结果的列名
+STUDENT_TREND_COLUMNS = ['考试', '日期', '姓名', '班级', '总分', '排名', '班内排名', '等级', '考试人数']
+CLASS_PROGRESSION_COLUMNS = ['考试', '日期', '班级', '人数', '平均分', '最高分', '最低分']
+EXAM_COLUMNS = ['考试', '日期', '人数', '保存时间']
+
+class HistoryStore:
+    """本地历史成绩库（SQLite）；同一个对象可在多个线程（Streamlit 的各个会话）中使用"""
+    
+    def __init__(self, path: str = ':memory:'):
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=32)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA foreign_keys = ON")
+            if self.path != ':memory:':
+                # WAL 模式下写入考试时仍可并发查询
+                self._conn.execute("PRAGMA journal_mode = WAL")
+                self._conn.execute("PRAGMA synchronous = NORMAL")
+            # 64 MB 页缓存，批量写入大考试时减少 B 树页的换入换出
+            self._conn.execute("PRAGMA cache_size = -65536")
+            self._conn.executescript(SCHEMA_SQL)
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    
+    def save_exam(self, name: str, graded_df: pd.DataFrame, taken_at=None, cutoffs: Optional[dict] = None,
+                  replace: bool = False) -> int:
+        """保存一次考试的成绩（需包含学号、姓名、班级、总分、排名、等级列，班内排名可选），返回考试编号
+        
+        同名考试已存在时 replace=False 抛出 ValueError，replace=True 时替换原有成绩；有学号为空的记录时抛出 ValueError。
+        """
+        name = name.strip()
+        if not name:
+            raise ValueError("考试名称不能为空")
+        taken_at = _date_text(taken_at)
+        missing_ids = int(graded_df['学号'].isna().sum())
+        if missing_ids:
+            raise ValueError(f"有 {missing_ids} 条记录没有学号，无法保存")
+        
+        columns = _result_columns(graded_df)
+        class_rows = _class_stats_rows(graded_df)
+        cutoffs_text = json.dumps(cutoffs, ensure_ascii=False) if cutoffs is not None else None
+        
+        with self._lock, self._conn:
+            existing = self._conn.execute("SELECT id FROM exams WHERE name = ?", (name,)).fetchone()
+            if existing is not None:
+                if not replace:
+                    raise ValueError(f"已有名为“{name}”的考试")
+                self._conn.execute("DELETE FROM exams WHERE id = ?", existing)
+            
+            exam_id = self._conn.execute(
+                INSERT_EXAM_SQL, (name, taken_at, datetime.now().isoformat(timespec='seconds'), len(graded_df), cutoffs_text)
+            ).lastrowid
+            student_ids, *values = columns
+            self._conn.executemany(INSERT_RESULT_SQL, zip(student_ids, repeat(exam_id), *values))
+            self._conn.executemany(INSERT_CLASS_STATS_SQL, ((exam_id,) + row for row in class_rows))
+        return exam_id
+    
+    def delete_exam(self, name: str) -> bool:
+        """删除一次考试及其成绩，返回是否存在该考试"""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM exams WHERE name = ?", (name,)).rowcount > 0
+    
+    def exams(self) -> pd.DataFrame:
+        """所有考试（按考试日期排列）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, taken_at, students, saved_at FROM exams ORDER BY taken_at, id"
+            ).fetchall()
+        return pd.DataFrame(rows, columns=EXAM_COLUMNS)
+    
+    def exam_cutoffs(self, name: str) -> Optional[dict]:
+        """保存考试时使用的等级分数线"""
+        with self._lock:
+            row = self._conn.execute("SELECT cutoffs FROM exams WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+    
+    def classes(self) -> list:
+        """历史记录中出现过的班级"""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT class_name FROM class_stats ORDER BY class_name").fetchall()
+        return [row[0] for row in rows]
+    
+    def student_trend(self, student_id) -> pd.DataFrame:
+        """一个学生历次考试的成绩（按考试日期排列）"""
+        with self._lock:
+            rows = self._conn.execute(STUDENT_TREND_SQL, (str(student_id).strip(),)).fetchall()
+        return pd.DataFrame(rows, columns=STUDENT_TREND_COLUMNS)
+    
+    def class_progression(self, classes: Optional[list] = None) -> pd.DataFrame:
+        """各班历次考试的人数、平均分、最高/最低分及各等级人数（classes 为空时返回所有班级）"""
+        if classes:
+            sql = CLASS_PROGRESSION_SQL.format(where=f"WHERE c.class_name IN ({', '.join('?' * len(classes))})")
+            params = [str(class_name) for class_name in classes]
+        else:
+            sql, params = CLASS_PROGRESSION_SQL.format(where=''), []
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        
+        df = pd.DataFrame([row[:-1] for row in rows], columns=CLASS_PROGRESSION_COLUMNS)
+        level_counts = pd.DataFrame([json.loads(row[-1]) for row in rows], index=df.index)
+        if len(level_counts.columns):
+            # 等级列按从高到低排列，未定级在最后
+            graded = sorted((level for level in level_counts.columns if level.startswith('Level')), reverse=True)
+            others = [level for level in level_counts.columns if not level.startswith('Level')]
+            level_counts = level_counts[graded + others].fillna(0).astype(int)
+        return pd.concat([df, level_counts], axis=1)
+
+def _date_text(value) -> str:
+    """考试日期转换为 YYYY-MM-DD 文本（按文本排序即按日期排序），未指定时为今天"""
+    if value is None:
+        return date.today().isoformat()
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+def _nullable(series: pd.Series) -> list:
+    """转换为 Python 值的列表，空值为 None（写入数据库为 NULL）"""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+def _result_columns(graded_df: pd.DataFrame) -> tuple:
+    """成绩明细各列的值：(学号, 姓名, 班级, 总分, 排名, 班内排名, 等级)
+    
+    按学号排列，写入主键 B 树时基本是顺序追加；学号为整数列时按数值排序，省去字符串排序。
+    """
+    student_ids = graded_df['学号']
+    order = (student_ids if pd.api.types.is_integer_dtype(student_ids) else student_ids.astype(str)).argsort(kind='stable')
+    df = graded_df.take(order.to_numpy())
+    class_ranks = df['班内排名'] if '班内排名' in df.columns else pd.Series(None, index=df.index, dtype='Int64')
+    return (
+        df['学号'].astype(str).tolist(),
+        _nullable(df['姓名']),
+        _nullable(df['班级']),
+        df['总分'].to_numpy(dtype=float).tolist(),
+        df['排名'].to_numpy(dtype=int).tolist(),
+        _nullable(class_ranks.astype('Int64')),
+        _nullable(df['等级'])
+    )
+
+def _class_stats_rows(graded_df: pd.DataFrame) -> list:
+    """各班汇总的行：(班级, 人数, 平均分, 最高分, 最低分, 各等级人数 JSON)；没有班级的学生不计入"""
+    df = pd.DataFrame({
+        '班级': graded_df['班级'].astype('category'),
+        '等级': graded_df['等级'].astype('category'),
+        '总分': graded_df['总分'].astype(float)
+    })
+    summary = df.groupby('班级', observed=True)['总分'].agg(['count', 'mean', 'max', 'min'])
+    levels = df.groupby(['班级', '等级'], observed=True).size().unstack(fill_value=0).reindex(summary.index, fill_value=0)
+    return [
+        (
+            str(class_name), int(row['count']), float(row['mean']), float(row['max']), float(row['min']),
+            json.dumps({str(level): int(count) for level, count in levels.loc[class_name].items() if count > 0}, ensure_ascii=False)
+        )
+        for class_name, row in summary.iterrows()
+    ]
@@ -1,55 +1,146 @@
+import argparse
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 
-def generate_sample_data(num_students=30):
-    """生成示例学生成绩数据"""
-    np.random.seed(42)  # 设置随机种子，确保结果可重现
-    
+# 学生姓名用字
+SURNAMES = ['张', '李', '王', '刘', '陈', '杨', '赵', '黄', '周', '吴', '徐', '孙', '胡', '朱', '高', '林', '何', '郭', '马', '罗']
+GIVEN_NAMES = ['伟', '芳', '娜', '秀英', '敏', '静', '丽', '强', '磊', '军', '洋', '勇', '艳', '杰', '娟', '涛', '明', '超', '秀兰', '霞']
+
+CHINESE_NUMERALS = ['一', '二', '三', '四', '五', '六', '七', '八', '九', '十']
+
+# 分批生成时每批的行数
+DEFAULT_CHUNK_SIZE = 100_000
+
+def class_names(num_classes: int) -> list:
+    """生成班级名称：十个班以内为“一班”到“十班”，更多时为“1班”、“2班”……"""
+    if num_classes <= len(CHINESE_NUMERALS):
+        return [f"{numeral}班" for numeral in CHINESE_NUMERALS[:num_classes]]
+    return [f"{i}班" for i in range(1, num_classes + 1)]
+
+def _generate_chunk(rng, start: int, size: int, classes: list, jia_distribution: tuple, yi_distribution: tuple,
+                    missing_rate: float, duplicate_rate: float) -> pd.DataFrame:
+    """向量化生成一批学生数据，学号从 start + 1 开始"""
     # 生成学生姓名
-    surnames = ['张', '李', '王', '刘', '陈', '杨', '赵', '黄', '周', '吴', '徐', '孙', '胡', '朱', '高', '林', '何', '郭', '马', '罗']
-    names = ['伟', '芳', '娜', '秀英', '敏', '静', '丽', '强', '磊', '军', '洋', '勇', '艳', '杰', '娟', '涛', '明', '超', '秀兰', '霞']
-    
-    student_names = []
-    for _ in range(num_students):
-        name = np.random.choice(surnames) + np.random.choice(names)
-        student_names.append(name)
+    student_names = np.char.add(
+        np.array(SURNAMES)[rng.integers(0, len(SURNAMES), size)],
+        np.array(GIVEN_NAMES)[rng.integers(0, len(GIVEN_NAMES), size)]
+    )
     
     # 生成学号
-    student_ids = [f"2024{str(i+1).zfill(4)}" for i in range(num_students)]
+    student_ids = '2024' + pd.Index(np.arange(start + 1, start + size + 1)).astype(str).str.zfill(4)
     
     # 生成班级
-    classes = ['一班', '二班', '三班', '四班', '五班']
-    student_classes = np.random.choice(classes, num_students)
+    student_classes = pd.Categorical.from_codes(rng.integers(0, len(classes), size), categories=classes)
     
-    # 生成甲部分数 (满分50分)
-    jia_scores = np.random.normal(35, 8, num_students)
-    jia_scores = np.clip(jia_scores, 0, 50)  # 限制在0-50之间
-    jia_scores = np.round(jia_scores, 1)
+    # 生成甲部分数 (满分50分) 和乙部分数 (满分103分)
+    jia_scores = np.round(np.clip(rng.normal(*jia_distribution, size), 0, 50), 1)
+    yi_scores = np.round(np.clip(rng.normal(*yi_distribution, size), 0, 103), 1)
     
-    # 生成乙部分数 (满分103分)
-    yi_scores = np.random.normal(75, 15, num_students)
-    yi_scores = np.clip(yi_scores, 0, 103)  # 限制在0-103之间
-    yi_scores = np.round(yi_scores, 1)
+    # 部分学生复制其他学生的分数，制造同分
+    if duplicate_rate > 0:
+        duplicated = rng.random(size) < duplicate_rate
+        sources = rng.integers(0, size, duplicated.sum())
+        jia_scores[duplicated] = jia_scores[sources]
+        yi_scores[duplicated] = yi_scores[sources]
     
-    # 创建数据框
-    data = {
+    # 部分分数缺失（缺考）
+    if missing_rate > 0:
+        jia_scores[rng.random(size) < missing_rate] = np.nan
+        yi_scores[rng.random(size) < missing_rate] = np.nan
+    
+    return pd.DataFrame({
         '姓名': student_names,
         '学号': student_ids,
         '班级': student_classes,
         '甲部分数': jia_scores,
         '乙部分数': yi_scores
-    }
+    })
+
+def iter_sample_chunks(num_students: int, chunk_size: int = DEFAULT_CHUNK_SIZE, seed: int = 42,
+                       num_classes: int = 5, jia_distribution: tuple = (35, 8), yi_distribution: tuple = (75, 15),
+                       missing_rate: float = 0.0, duplicate_rate: float = 0.0):
+    """分批生成示例学生成绩数据，每批最多 chunk_size 行
     
-    df = pd.DataFrame(data)
-    return df
+    jia_distribution / yi_distribution 为甲、乙部分数正态分布的 (均值, 标准差)；
+    missing_rate 为每个分数缺失的概率；duplicate_rate 为复制其他学生分数（制造同分）的比例。
+    相同的 seed 和 chunk_size 生成相同的数据。
+    """
+    rng = np.random.default_rng(seed)
+    classes = class_names(num_classes)
+    # 人数为0时也生成一批空数据，写出的文件仍带标题行
+    for start in range(0, num_students, chunk_size) or [0]:
+        size = min(chunk_size, num_students - start)
+        yield _generate_chunk(rng, start, size, classes, jia_distribution, yi_distribution, missing_rate, duplicate_rate)
 
-if __name__ == "__main__":
-    # 生成示例数据
-    sample_df = generate_sample_data(30)
+def generate_sample_data(num_students=30, seed=42, **options):
+    """生成示例学生成绩数据（参数同 iter_sample_chunks）"""
+    return next(iter_sample_chunks(num_students, chunk_size=max(num_students, 1), seed=seed, **options))
+
+def write_sample_data(path, num_students: int, chunk_size: int = DEFAULT_CHUNK_SIZE, seed: int = 42, **options) -> Path:
+    """分批生成示例数据并直接写入文件（按扩展名写为 .csv、.xlsx 或 .parquet），内存占用只与批大小有关"""
+    path = Path(path)
+    chunks = iter_sample_chunks(num_students, chunk_size, seed, **options)
+    suffix = path.suffix.lower()
     
-    # 保存为Excel文件
-    sample_df.to_excel('示例学生成绩.xlsx', index=False)
-    print("✅ 示例数据已生成并保存为 '示例学生成绩.xlsx'")
-    print(f"📊 共生成 {len(sample_df)} 条学生记录")
+    if suffix == '.csv':
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, index=False, header=(i == 0))
+    elif suffix == '.xlsx':
+        from openpyxl import Workbook
+        
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet('Sheet1')
+        worksheet.append(['姓名', '学号', '班级', '甲部分数', '乙部分数'])
+        for chunk in chunks:
+            chunk = chunk.astype(object)
+            for row in chunk.where(chunk.notna(), None).itertuples(index=False, name=None):
+                worksheet.append(row)
+        workbook.save(path)
+    elif suffix == '.parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk.astype({'班级': str}), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        raise ValueError(f"不支持的文件类型：{path.suffix}（支持 .csv、.xlsx、.parquet）")
+    
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成示例学生成绩数据")
+    parser.add_argument('-n', '--rows', type=int, default=30, help="学生人数（默认：30）")
+    parser.add_argument('-o', '--output', default='示例学生成绩.xlsx', help="输出文件（.csv、.xlsx 或 .parquet）")
+    parser.add_argument('--seed', type=int, default=42, help="随机种子（默认：42）")
+    parser.add_argument('--classes', type=int, default=5, help="班级数（默认：5）")
+    parser.add_argument('--missing-rate', type=float, default=0.0, help="分数缺失比例（默认：0）")
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help="复制其他学生分数（同分）的比例（默认：0）")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="每批生成的行数")
+    args = parser.parse_args(argv)
+    
+    options = {
+        'chunk_size': args.chunk_size,
+        'seed': args.seed,
+        'num_classes': args.classes,
+        'missing_rate': args.missing_rate,
+        'duplicate_rate': args.duplicate_rate
+    }
+    path = write_sample_data(args.output, args.rows, **options)
+    print(f"✅ 示例数据已生成并保存为 '{path}'")
+    print(f"📊 共生成 {args.rows} 条学生记录")
     print("\n📋 数据预览：")
-    print(sample_df.head())
+    print(next(iter_sample_chunks(args.rows, **options)).head())
+
+if __name__ == "__main__":
+    main()
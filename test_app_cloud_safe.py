@@ -4,14 +4,30 @@
 """
 
 import pandas as pd
+import numpy as np
 import sys
 import os
+import io
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # 导入应用中的函数
-from app_cloud_safe import calculate_total_score, process_data, assign_grades, validate_cutoff_input
+from app_cloud_safe import (
+    calculate_total_score, can_use_counting_rank, process_data, assign_grades,
+    validate_cutoff_input, load_upload, upload_cache_stats, MissingColumnsError, ScoreDistribution,
+    level_styles, style_levels, LEVEL_COLORS, export_results_excel,
+    request_export, export_status, read_csv_fast, read_excel_streaming, list_excel_sheets,
+    _read_excel_openpyxl, compact_frame, widen_scores, frame_memory, session_memory_report,
+    cached_cohort, cache_memory_bytes, enforce_memory_budget, trim_session_exports, _sessions, _upload_cache,
+    _export_cache, StageTimer, NULL_TIMER, filter_results, page_bounds, ClassAnalytics, GRADE_DTYPE,
+    solve_cutoffs, evaluate_scenarios, GRADE_LEVELS, ScoringSchema, ScoreComponent, DEFAULT_SCHEMA,
+    read_upload, validate_scores, apply_column_dtypes, rescore_delta, compare_cohorts, delta_levels, DEFAULT_CUTOFFS, LRUCache
+)
 
 def test_calculate_total_score():
     """测试总分计算功能"""
@@ -35,6 +51,27 @@ def test_calculate_total_score():
     
     print()
 
+def test_default_schema_total_scores():
+    """测试默认计分方案的向量化总分计算与逐行计算结果一致"""
+    print("🧮 测试向量化总分计算...")
+    
+    rng = np.random.default_rng(0)
+    jia = np.round(rng.uniform(0, 50, 5000), 1)
+    yi = np.round(rng.uniform(0, 103, 5000), 1)
+    # 加入恰好落在 .5 上的边界值（如 甲部=25, 乙部=0 -> 15.0；甲部=2.5 -> 1.5）
+    jia = np.concatenate([jia, [25, 2.5, 7.5, 0, 50]])
+    yi = np.concatenate([yi, [0, 0, 0, 103, 0]])
+    
+    expected = [calculate_total_score({'甲部分数': j, '乙部分数': y}) for j, y in zip(jia, yi)]
+    result = DEFAULT_SCHEMA.total_scores(pd.DataFrame({'甲部分数': jia, '乙部分数': yi}))
+    mismatches = int((result != np.array(expected)).sum())
+    
+    status = "✅" if mismatches == 0 else "❌"
+    print(f"  {status} {len(expected)} 条记录，不一致 {mismatches} 条")
+    assert mismatches == 0
+    
+    print()
+
 def test_process_data():
     """测试数据处理功能"""
     print("📊 测试数据处理...")
@@ -100,6 +137,39 @@ def test_assign_grades():
     
     print()
 
+def test_assign_grades_binning():
+    """测试分箱等级分配与逐级覆盖的结果一致"""
+    print("🏆 测试分箱等级分配...")
+    
+    def reference_grades(scores, cutoff_scores):
+        grades = pd.Series('未定级', index=scores.index)
+        for level in ['Level2', 'Level3', 'Level4', 'Level5', 'Level6', 'Level7']:
+            if level in cutoff_scores and cutoff_scores[level] > 0:
+                grades[scores >= cutoff_scores[level]] = level
+        return grades
+    
+    test_df = pd.DataFrame({'总分': np.arange(101)})
+    cutoff_cases = [
+        {'Level2': 47, 'Level3': 53, 'Level4': 58, 'Level5': 63, 'Level6': 66, 'Level7': 70},
+        {'Level2': 0, 'Level3': 53, 'Level4': 0, 'Level5': 63, 'Level6': 66, 'Level7': 0},  # 部分等级停用
+        {'Level2': 60, 'Level3': 50, 'Level4': 58, 'Level5': 40, 'Level6': 90, 'Level7': 85},  # 分数线未递增
+        {'Level2': 0, 'Level3': 0, 'Level4': 0, 'Level5': 0, 'Level6': 0, 'Level7': 0},  # 全部停用
+        {'Level7': 100}  # 只设置部分等级
+    ]
+    
+    for i, cutoffs in enumerate(cutoff_cases):
+        graded_df = assign_grades(test_df, cutoffs)
+        expected = reference_grades(test_df['总分'], cutoffs)
+        same = (graded_df['等级'].astype(str) == expected).all()
+        print(f"  分数线组合 {i+1}: {'✅' if same else '❌'}")
+        assert same
+    
+    is_categorical = isinstance(graded_df['等级'].dtype, pd.CategoricalDtype) and graded_df['等级'].cat.ordered
+    print(f"  等级列为有序分类类型: {'✅' if is_categorical else '❌'}")
+    assert is_categorical
+    
+    print()
+
 def test_validate_cutoff_input():
     """测试等级分数线输入验证"""
     print("🔢 测试等级分数线输入验证...")
@@ -156,6 +226,772 @@ def test_ranking_logic():
     print("  ✅ 相同分数获得相同排名")
     print()
 
+def test_counting_rank():
+    """测试计数排序排名与通用排序排名结果一致"""
+    print("📈 测试计数排序排名...")
+    
+    rng = np.random.default_rng(1)
+    test_df = pd.DataFrame({
+        '学号': [f"{i:05d}" for i in range(3000)],
+        '甲部分数': np.round(rng.uniform(0, 50, 3000), 1),
+        '乙部分数': np.round(rng.uniform(0, 103, 3000), 1)
+    })
+    
+    counting_df = process_data(test_df, ranking='counting')
+    sorted_df = process_data(test_df, ranking='sort')
+    
+    same = counting_df.equals(sorted_df)
+    print(f"  计数排序与通用排序结果一致: {'✅' if same else '❌'}")
+    assert same
+    
+    # 非整数总分时不使用计数排序
+    fallback = not can_use_counting_rank(np.array([90.5, 80.0]))
+    print(f"  非整数总分回退到通用排序: {'✅' if fallback else '❌'}")
+    assert fallback
+    
+    print()
+
+def test_upload_cache():
+    """测试按内容摘要缓存上传文件的解析结果"""
+    print("🗄️ 测试上传缓存...")
+    
+    csv_data = "姓名,学号,班级,甲部分数,乙部分数\n张三,001,一班,45,95\n李四,002,一班,42,88\n".encode('utf-8')
+    edited_data = csv_data.replace(b"42,88", b"43,87")  # 修改分数但文件大小不变
+    
+    before = upload_cache_stats()
+    cohort1 = load_upload('成绩.csv', csv_data)
+    cohort2 = load_upload('另一个名字.csv', csv_data)
+    cohort3 = load_upload('成绩.csv', edited_data)
+    after = upload_cache_stats()
+    
+    hits = after['hits'] - before['hits']
+    misses = after['misses'] - before['misses']
+    print(f"  命中 {hits} 次，未命中 {misses} 次")
+    assert cohort1.key == cohort2.key and cohort1.processed_df is cohort2.processed_df
+    assert cohort3.key != cohort1.key and len(edited_data) == len(csv_data)
+    assert (hits, misses) == (1, 2)
+    
+    try:
+        load_upload('缺列.csv', "姓名,学号\n张三,001\n".encode('utf-8'))
+        missing = None
+    except MissingColumnsError as e:
+        missing = e.missing_columns
+    print(f"  缺少必要列时报错: {'✅' if missing == ['班级', '甲部分数', '乙部分数'] else '❌'}")
+    assert missing == ['班级', '甲部分数', '乙部分数']
+    
+    print()
+
+def test_score_distribution():
+    """测试由总分分布查表得到的等级人数与逐行分配结果一致"""
+    print("📊 测试总分分布查表...")
+    
+    rng = np.random.default_rng(2)
+    test_df = pd.DataFrame({
+        '甲部分数': np.round(rng.uniform(0, 50, 2000), 1),
+        '乙部分数': np.round(rng.uniform(0, 103, 2000), 1)
+    })
+    processed_df = process_data(test_df)
+    distribution = ScoreDistribution.from_processed(processed_df)
+    
+    cutoff_cases = [
+        {'Level2': 47, 'Level3': 53, 'Level4': 58, 'Level5': 63, 'Level6': 66, 'Level7': 70},
+        {'Level2': 0, 'Level3': 30, 'Level4': 30, 'Level5': 0, 'Level6': 80, 'Level7': 75}
+    ]
+    for i, cutoffs in enumerate(cutoff_cases):
+        expected = assign_grades(processed_df, cutoffs)['等级'].value_counts().to_dict()
+        counts = distribution.level_counts(cutoffs)
+        same = counts == expected
+        print(f"  分数线组合 {i+1}: {'✅' if same else '❌'} {counts}")
+        assert same
+    
+    # 非整数总分使用去重后的分数表
+    float_distribution = ScoreDistribution(np.array([50.5, 60.0, 60.0, 72.5]))
+    counts = float_distribution.level_counts({'Level2': 55, 'Level7': 70})
+    print(f"  非整数总分: {'✅' if counts['Level2'] == 2 and counts['Level7'] == 1 else '❌'}")
+    assert (counts['未定级'], counts['Level2'], counts['Level7']) == (1, 2, 1)
+    
+    print()
+
+def test_level_styles():
+    """测试按等级整行着色及大表降级"""
+    print("🎨 测试等级着色...")
+    
+    test_df = pd.DataFrame({'姓名': ['张三', '李四', '王五'], '总分': [75, 50, 30]})
+    graded_df = assign_grades(test_df, {'Level2': 47, 'Level7': 70})
+    
+    styles = level_styles(graded_df)
+    expected_colors = [LEVEL_COLORS['Level7'], LEVEL_COLORS['Level2'], LEVEL_COLORS['未定级']]
+    same = all((styles.iloc[i] == f'background-color: {color}').all() for i, color in enumerate(expected_colors))
+    print(f"  整行颜色与等级对应: {'✅' if same else '❌'}")
+    assert same and styles.shape == graded_df.shape
+    
+    full = style_levels(graded_df)
+    column_only = style_levels(graded_df, max_cells=5)
+    plain = style_levels(graded_df, max_cells=2)
+    print(f"  大表降级为仅等级列着色/不着色: {'✅' if plain is graded_df else '❌'}")
+    assert full is not graded_df and column_only is not graded_df and plain is graded_df
+    
+    print()
+
+def test_export_results_excel():
+    """测试流式导出Excel：数据、条件格式着色及超过Z列的列宽"""
+    print("💾 测试导出Excel...")
+    from openpyxl import load_workbook
+    
+    test_df = pd.DataFrame({
+        '姓名': ['张三', None, '王五'],
+        '总分': [75, 50, 30]
+    })
+    for i in range(30):
+        test_df[f'附加列{i}'] = i
+    graded_df = assign_grades(test_df, {'Level2': 47, 'Level7': 70})
+    
+    worksheet = load_workbook(io.BytesIO(export_results_excel(graded_df))).active
+    rows = list(worksheet.iter_rows(values_only=True))
+    
+    header_ok = list(rows[0]) == list(graded_df.columns)
+    values_ok = rows[1][0] == '张三' and rows[2][0] is None and [row[-1] for row in rows[1:]] == ['Level7', 'Level2', '未定级']
+    rules = [rule for cf in worksheet.conditional_formatting for rule in cf.rules]
+    widths_ok = worksheet.column_dimensions['AG'].width == len('Level7') + 2  # 第33列为等级列
+    
+    print(f"  标题和数据正确: {'✅' if header_ok and values_ok else '❌'}")
+    print(f"  每个等级一条条件格式规则: {'✅' if len(rules) == len(LEVEL_COLORS) else '❌'}")
+    print(f"  超过Z列的列宽设置: {'✅' if widths_ok else '❌'}")
+    assert header_ok and values_ok and len(rules) == len(LEVEL_COLORS) and widths_ok
+    
+    print()
+
+def test_request_export():
+    """测试后台导出及按 (数据, 分数线) 缓存导出结果"""
+    print("📦 测试后台导出缓存...")
+    
+    csv_data = "姓名,学号,班级,甲部分数,乙部分数\n张三,001,一班,45,95\n李四,002,二班,30,60\n".encode('utf-8')
+    cohort = load_upload('导出测试.csv', csv_data)
+    cutoffs = {'Level2': 47, 'Level3': 53, 'Level4': 58, 'Level5': 63, 'Level6': 66, 'Level7': 70}
+    
+    status_before = export_status(cohort, cutoffs)
+    first = request_export(cohort, cutoffs).result(timeout=60)
+    status_after = export_status(cohort, cutoffs)
+    second = request_export(cohort, dict(reversed(list(cutoffs.items())))).result(timeout=0)
+    other = request_export(cohort, dict(cutoffs, Level7=90)).result(timeout=60)
+    
+    print(f"  导出状态: {status_before} -> {status_after}")
+    print(f"  相同数据和分数线复用缓存: {'✅' if second is first else '❌'}")
+    assert status_before == 'none' and status_after == 'ready'
+    assert second is first and other is not first
+    
+    print()
+
+def test_read_csv_fast():
+    """测试只读取需要的列、显式类型及分块读取"""
+    print("⚡ 测试快速读取CSV...")
+    
+    csv_data = (
+        "序号,姓名,学号,班级,甲部分数,乙部分数,备注,性别\n"
+        "1,张三,001,一班,45,,转学,男\n"
+        "2,李四,002,二班,,88,,女\n"
+    ).encode('utf-8')
+    
+    full_df = read_csv_fast(csv_data)
+    pruned_df = read_csv_fast(csv_data, columns=['性别'])
+    chunked_df = read_csv_fast(csv_data, columns=['性别'], chunk_threshold=0)
+    
+    print(f"  全部列: {list(full_df.columns)}")
+    print(f"  只读必要列和性别: {list(pruned_df.columns)}")
+    assert list(pruned_df.columns) == ['姓名', '学号', '班级', '甲部分数', '乙部分数', '性别']
+    assert list(pruned_df['学号']) == ['001', '002']  # 学号保留前导0
+    assert pruned_df['甲部分数'].dtype == np.float64
+    assert chunked_df.equals(pruned_df.astype(chunked_df.dtypes.to_dict()))
+    
+    # 空白的文本单元格两种引擎都读取为空值（与文件大小无关）
+    blank_data = "姓名,学号,班级,甲部分数,乙部分数\n张三,,一班,45,90\n,,二班,40,80\n王五,003,,30,60\n".encode('utf-8')
+    arrow_df = read_csv_fast(blank_data)
+    pandas_df = read_csv_fast(blank_data, chunk_threshold=0)
+    print(f"  空白学号: {arrow_df['学号'].tolist()} / {pandas_df['学号'].tolist()}")
+    for col in ('姓名', '学号', '班级'):
+        assert arrow_df[col].isna().tolist() == pandas_df[col].isna().tolist()
+    assert arrow_df['学号'].isna().tolist() == [True, True, False]
+    assert validate_scores(arrow_df)[1].equals(validate_scores(pandas_df)[1])
+    
+    # 读取后只在分数列填充空值
+    cohort = load_upload('快速读取.csv', csv_data, columns=[])
+    original_df = cohort.original_df
+    print(f"  分数列空值填0: {'✅' if original_df['甲部分数'].tolist() == [45.0, 0.0] else '❌'}")
+    assert original_df['甲部分数'].tolist() == [45.0, 0.0] and original_df['乙部分数'].tolist() == [0.0, 88.0]
+    assert list(original_df.columns) == ['姓名', '学号', '班级', '甲部分数', '乙部分数']
+    
+    print()
+
+def test_read_excel_streaming():
+    """测试流式读取xlsx：选择工作表、只读取需要的列"""
+    print("📗 测试流式读取xlsx...")
+    
+    test_df = pd.DataFrame({
+        '序号': [1, 2, 3],
+        '姓名': ['张三', '李四', '王五'],
+        '学号': ['001', '002', '003'],
+        '班级': ['一班', '一班', '二班'],
+        '甲部分数': [45, None, 48],
+        '乙部分数': [95, 88, 92.5],
+        '备注': ['', '缺考', '']
+    })
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        pd.DataFrame({'说明': ['封面']}).to_excel(writer, sheet_name='封面', index=False)
+        test_df.to_excel(writer, sheet_name='成绩', index=False)
+    data = buffer.getvalue()
+    
+    sheets = list_excel_sheets(data)
+    df = read_excel_streaming(data, sheet_name='成绩', columns=[])
+    openpyxl_df = _read_excel_openpyxl(data, sheet_name='成绩', columns=[])
+    csv_df = read_csv_fast(test_df.to_csv(index=False).encode('utf-8'), columns=[])
+    
+    print(f"  工作表: {sheets}")
+    print(f"  读取的列: {list(df.columns)}")
+    assert sheets == ['封面', '成绩']
+    assert list(df.columns) == ['姓名', '学号', '班级', '甲部分数', '乙部分数']
+    assert df.equals(csv_df) and openpyxl_df.equals(csv_df)
+    assert list(read_excel_streaming(data, sheet_name='成绩').columns) == list(test_df.columns)
+    
+    try:
+        read_excel_streaming(data)  # 第一个工作表缺少必要列
+        missing = False
+    except MissingColumnsError:
+        missing = True
+    print(f"  默认读取第一个工作表并检查必要列: {'✅' if missing else '❌'}")
+    assert missing
+    
+    print()
+
+def test_compact_frame():
+    """测试紧凑类型转换及分数还原"""
+    print("🗜️ 测试紧凑存储...")
+    
+    rng = np.random.default_rng(3)
+    test_df = pd.DataFrame({
+        '姓名': [f"学生{i}" for i in range(5000)],
+        '学号': [str(20240001 + i) for i in range(5000)],
+        '班级': rng.choice(['一班', '二班', '三班'], 5000),
+        '甲部分数': np.round(rng.uniform(0, 50, 5000), 1),
+        '乙部分数': np.round(rng.uniform(0, 103, 5000), 1)
+    })
+    processed_df = process_data(test_df)
+    compact_df = compact_frame(processed_df)
+    
+    print(f"  内存: {frame_memory(processed_df) / 1024:.0f} KB -> {frame_memory(compact_df) / 1024:.0f} KB")
+    print(f"  类型: {dict(compact_df.dtypes.astype(str))}")
+    assert frame_memory(compact_df) < frame_memory(processed_df)
+    assert compact_df['总分'].dtype == np.uint8 and compact_df['排名'].dtype == np.uint16
+    assert compact_df['学号'].dtype == np.int64 and compact_df['班级'].dtype == 'category'
+    assert compact_df['甲部分数'].dtype == np.float32
+    
+    # 还原后的分数与原始分数完全相同
+    widened_df = widen_scores(compact_df)
+    assert widened_df['甲部分数'].equals(processed_df['甲部分数']) and widened_df['乙部分数'].equals(processed_df['乙部分数'])
+    
+    # 有前导0的学号保持为文本（分类类型）
+    id_df = compact_frame(pd.DataFrame({'学号': ['001', '002', '001']}))
+    assert id_df['学号'].dtype == 'category' and list(id_df['学号'].astype(str)) == ['001', '002', '001']
+    
+    report = session_memory_report({'数据': compact_df, '文件': b'12345', '其他': 1})
+    assert report == {'数据': frame_memory(compact_df), '文件': 5}
+    
+    print()
+
+def test_memory_budget():
+    """测试流程不复制整表，以及按内存预算释放空闲会话的数据和导出文件"""
+    print("🧠 测试内存预算...")
+    
+    test_df = pd.DataFrame({
+        '姓名': ['张三', '李四', '王五'],
+        '甲部分数': [30.0, 45.0, 40.0],
+        '乙部分数': [60.0, 95.0, 80.0]
+    })
+    processed_df = process_data(test_df)
+    final_df = assign_grades(processed_df, {'Level2': 47, 'Level3': 53, 'Level4': 58, 'Level5': 63, 'Level6': 66, 'Level7': 70})
+    shared = np.shares_memory(final_df['总分'].to_numpy(), processed_df['总分'].to_numpy())
+    print(f"  分配等级不复制已有列: {'✅' if shared else '❌'}")
+    assert shared and '总分' not in test_df.columns and '等级' not in processed_df.columns
+    
+    # 会话只保留计算结果，原始数据按原行号还原
+    csv_data = "姓名,学号,班级,甲部分数,乙部分数\n张三,001,一班,30,60\n李四,002,一班,45,95\n".encode('utf-8')
+    active = load_upload('活跃会话.csv', csv_data)
+    idle = load_upload('空闲会话.csv', csv_data.replace(b"30,60", b"31,61"))
+    assert list(active.original_df['姓名']) == ['张三', '李四'] and list(active.processed_df['姓名']) == ['李四', '张三']
+    assert '原始数据' not in active.memory_usage()
+    
+    # 超出全局预算时先释放未被活跃会话使用的条目
+    _sessions.touch('活跃会话', active.key)
+    freed = enforce_memory_budget(budget_bytes=_upload_cache.size_of(active.key))
+    print(f"  释放 {freed} 字节，剩余 {cache_memory_bytes()} 字节")
+    assert cached_cohort(active.key) is active and cached_cohort(idle.key) is None
+    
+    # 会话空闲超时后，其数据也可被释放
+    enforce_memory_budget(budget_bytes=0, idle_seconds=0)
+    assert cached_cohort(active.key) is None and len(_sessions) == 0
+    
+    # 超出单会话预算时释放较早的导出文件，最近一次导出保留
+    cohort = load_upload('活跃会话.csv', csv_data)
+    _export_cache.put(('测试', 1), b'a' * 100)
+    _export_cache.put(('测试', 2), b'b' * 100)
+    kept = trim_session_exports(cohort.key, [('测试', 1), ('测试', 2)], _upload_cache.size_of(cohort.key) + 150)
+    print(f"  单会话预算内保留的导出文件: {kept}")
+    assert kept == [('测试', 2)] and ('测试', 1) not in _export_cache
+    
+    print()
+
+def test_shared_cohort_cache():
+    """测试多个会话同时上传同一文件时只解析一次、共享只读数据，以及使用中的条目不按条目数淘汰"""
+    print("🤝 测试共享数据缓存...")
+    
+    # 同一个键同时只计算一次，其他线程等待并共享结果
+    cache = LRUCache(2)
+    calls = []
+    def slow_compute():
+        calls.append(threading.get_ident())
+        time.sleep(0.2)
+        return object()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        values = list(executor.map(lambda _: cache.get_or_compute('总表', slow_compute), range(8)))
+    stats = cache.stats()
+    print(f"  8 个线程同时请求：计算 {len(calls)} 次，命中 {stats['hits']} 次")
+    assert len(calls) == 1 and all(value is values[0] for value in values)
+    assert (stats['hits'], stats['misses'], stats['pending']) == (7, 1, 0)
+    
+    # 计算出错时等待的线程一起收到异常，之后可重新计算
+    def failing():
+        time.sleep(0.1)
+        raise ValueError("解析失败")
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(cache.get_or_compute, '坏文件', failing) for _ in range(3)]
+    assert all(isinstance(future.exception(), ValueError) for future in futures)
+    assert cache.get_or_compute('坏文件', lambda: 1) == 1
+    
+    # 使用中的条目不按条目数淘汰
+    in_use = {'a'}
+    pinned_cache = LRUCache(2, pinned=lambda: in_use)
+    for key in ('a', 'b', 'c', 'd'):
+        pinned_cache.put(key, key)
+    print(f"  使用中的条目保留: {pinned_cache.keys()}")
+    assert pinned_cache.keys() == ['a', 'd']
+    
+    # 各会话拿到同一份只读数据，只在其上派生自己的结果
+    csv_data = "姓名,学号,班级,甲部分数,乙部分数\n张三,001,一班,30,60\n李四,002,二班,45,95\n".encode('utf-8')
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        cohorts = list(executor.map(lambda _: load_upload('年级总表.csv', csv_data), range(4)))
+    assert all(cohort is cohorts[0] for cohort in cohorts)
+    cohort = cohorts[0]
+    for col, value in (('总分', 0), ('班级', '二班'), ('甲部分数', 0.0)):
+        try:
+            cohort.processed_df.loc[cohort.processed_df.index[0], col] = value
+            assert False, f"{col} 不应允许原地修改"
+        except ValueError:
+            pass
+    assert not cohort.distribution.counts.flags.writeable and not cohort.analytics.class_ranks.flags.writeable
+    final_df = assign_grades(cohort.processed_df, DEFAULT_CUTOFFS)
+    final_df['班内排名'] = cohort.analytics.class_rank_column()
+    print(f"  只读数据上定级: {final_df['等级'].tolist()}")
+    assert list(final_df['总分']) == [92, 59] and '等级' not in cohort.processed_df.columns
+    
+    _sessions.touch('老师甲', cohort.key)
+    _sessions.touch('老师乙', cohort.key)
+    assert _sessions.cohort_refcounts()[cohort.key] == 2
+    _sessions.forget('老师甲')
+    _sessions.forget('老师乙')
+    
+    print()
+
+def test_stage_timer():
+    """测试各阶段计时和行数记录"""
+    print("⏱️ 测试阶段计时...")
+    
+    csv_data = "姓名,学号,班级,甲部分数,乙部分数\n张三,001,一班,45,95\n李四,002,一班,,88\n王五,003,二班,30,60\n".encode('utf-8')
+    timer = StageTimer()
+    load_upload('计时测试.csv', csv_data, timer=timer)
+    with timer.stage('渲染', 3):
+        pass
+    with timer.stage('渲染') as span:
+        span['rows'] = 5
+    
+    summary = timer.summary()
+    print(summary.to_string(index=False))
+    assert list(summary['阶段']) == ['读取', '填充/校验', '计算总分', '排序/排名', '压缩存储', '渲染']
+    assert list(summary['行数']) == [3, 3, 3, 3, 3, 5]
+    assert len(timer.records) == 7 and timer.total_seconds >= 0
+    
+    # 命中缓存时不记录读取和计算阶段；未开启时不记录
+    cached_timer = StageTimer()
+    load_upload('计时测试.csv', csv_data, timer=cached_timer)
+    process_data(pd.DataFrame({'甲部分数': [45.0], '乙部分数': [95.0]}), timer=NULL_TIMER)
+    assert cached_timer.records == [] and NULL_TIMER.records == []
+    
+    print()
+
+def test_filter_and_pages():
+    """测试结果表筛选、搜索和分页"""
+    print("🔎 测试筛选和分页...")
+    
+    csv_data = (
+        "姓名,学号,班级,甲部分数,乙部分数\n"
+        "张三,2024001,一班,45,95\n李四,2024002,二班,30,60\n张伟,2024013,二班,40,80\n王五,2024004,一班,20,40\n"
+    ).encode('utf-8')
+    cohort = load_upload('筛选测试.csv', csv_data)
+    final_df = assign_grades(cohort.processed_df, {'Level2': 47, 'Level3': 53, 'Level4': 58, 'Level5': 63, 'Level6': 66, 'Level7': 70})
+    
+    by_class = filter_results(final_df, classes=['二班'])
+    by_level = filter_results(final_df, levels=['未定级'])
+    by_name = filter_results(final_df, query='张')
+    by_id = filter_results(final_df, classes=['二班'], query='013')
+    print(f"  二班: {list(by_class['姓名'])}，未定级: {list(by_level['姓名'])}，搜索“张”: {list(by_name['姓名'])}")
+    assert list(by_class['姓名']) == ['张伟', '李四'] and list(by_level['姓名']) == ['王五']
+    assert list(by_name['姓名']) == ['张三', '张伟'] and list(by_id['姓名']) == ['张伟']
+    assert filter_results(final_df) is final_df
+    
+    # 原始数据按页取出，顺序与上传时一致
+    assert list(cohort.original_rows(1, 3)['姓名']) == ['李四', '张伟']
+    assert list(cohort.original_rows(1, 3).columns) == ['姓名', '学号', '班级', '甲部分数', '乙部分数']
+    
+    assert page_bounds(1234, 1, 100) == (0, 100, 13)
+    assert page_bounds(1234, 13, 100) == (1200, 1234, 13)
+    assert page_bounds(1234, 20, 100) == (1200, 1234, 13)  # 超出范围取最后一页
+    assert page_bounds(0, 1, 100) == (0, 0, 1)
+    
+    print()
+
+def test_class_analytics():
+    """测试由班级直方图得到的统计与逐项计算结果一致"""
+    print("🏫 测试班级统计...")
+    
+    rng = np.random.default_rng(4)
+    test_df = pd.DataFrame({
+        '班级': rng.choice(['一班', '二班', '三班'], 3000),
+        '甲部分数': np.round(rng.uniform(0, 50, 3000), 1),
+        '乙部分数': np.round(rng.uniform(0, 103, 3000), 1)
+    })
+    test_df.loc[:4, '班级'] = None  # 没有班级的学生只计入全体统计
+    processed_df = compact_frame(process_data(test_df))
+    analytics = ClassAnalytics.from_processed(processed_df)
+    
+    grouped = processed_df.groupby('班级', observed=True)['总分']
+    expected = pd.DataFrame({
+        '人数': grouped.size(), '平均分': grouped.mean(), '最高分': grouped.max(), '最低分': grouped.min(),
+        'P25': grouped.quantile(0.25), '中位数': grouped.median(), 'P75': grouped.quantile(0.75), 'P90': grouped.quantile(0.9)
+    })
+    summary = analytics.summary()
+    print(summary.round(1).to_string())
+    assert np.allclose(summary.loc[expected.index, expected.columns].to_numpy(float), expected.to_numpy(float))
+    assert list(summary['平均分']) == sorted(summary['平均分'], reverse=True)
+    
+    overall = analytics.overall()
+    assert overall['人数'] == 3000 and np.isclose(overall['平均分'], processed_df['总分'].mean())
+    assert overall['中位数'] == processed_df['总分'].median()
+    
+    # 班内排名与按班级分组的 RANK 一致
+    expected_ranks = grouped.rank(method='min', ascending=False).fillna(0).astype(int).to_numpy()
+    assert (analytics.class_ranks == expected_ranks).all()
+    assert analytics.class_rank_column().isna().sum() == 5
+    
+    cutoffs = {'Level2': 47, 'Level3': 53, 'Level4': 58, 'Level5': 63, 'Level6': 66, 'Level7': 70}
+    graded_df = assign_grades(processed_df, cutoffs)
+    expected_crosstab = pd.crosstab(graded_df['班级'], graded_df['等级']).reindex(columns=GRADE_DTYPE.categories, fill_value=0)
+    crosstab = analytics.crosstab(cutoffs)
+    assert (crosstab.loc[expected_crosstab.index.astype(str)].to_numpy() == expected_crosstab.to_numpy()).all()
+    
+    # 非整数总分使用去重后的分数表
+    float_analytics = ClassAnalytics(pd.Series(['甲', '甲', '乙']), np.array([1.5, 2.5, 3.0]))
+    assert list(float_analytics.class_ranks) == [2, 1, 1]
+    assert float_analytics.summary().loc['甲', '中位数'] == 2.0
+    
+    print()
+
+def test_solve_cutoffs():
+    """测试按各等级人数比例求分数线"""
+    print("🎯 测试按比例求分数线...")
+    
+    # 0-99 分各一人：比例可以精确达到
+    distribution = ScoreDistribution(np.arange(100))
+    quotas = {'Level7': 10, 'Level6': 10, 'Level5': 10, 'Level4': 10, 'Level3': 10, 'Level2': 10}
+    cutoffs = solve_cutoffs(distribution, quotas)
+    print(f"  均匀分布: {cutoffs}")
+    assert cutoffs == {'Level2': 40, 'Level3': 50, 'Level4': 60, 'Level5': 70, 'Level6': 80, 'Level7': 90}
+    counts = distribution.level_counts(cutoffs)
+    assert all(counts[level] == 10 for level in quotas) and counts['未定级'] == 40
+    
+    # 同分学生在同一等级：取最接近目标的分数线，误差相同时取较高的分数线
+    tied = ScoreDistribution(np.array([60] * 3 + [70] * 4 + [80] * 3))
+    tied_cutoffs = solve_cutoffs(tied, {'Level7': 20, 'Level6': 50})
+    print(f"  有同分: {tied_cutoffs}")
+    assert tied_cutoffs['Level7'] == 80 and tied_cutoffs['Level6'] == 70
+    assert tied_cutoffs['Level5'] == 0  # 比例为0的等级不启用
+    
+    # 比例为0的最高等级不启用，下一等级按自己的比例求分数线
+    top_empty = solve_cutoffs(distribution, {'Level7': 0, 'Level6': 10, 'Level5': 10, 'Level4': 10, 'Level3': 10, 'Level2': 10})
+    top_counts = distribution.level_counts(top_empty)
+    print(f"  Level7 比例为0: {top_empty}")
+    assert top_empty['Level7'] == 0 and top_counts['Level7'] == 0 and top_counts['Level6'] == 10
+    full_scale = ScoreDistribution(np.arange(101))
+    full_counts = full_scale.level_counts(solve_cutoffs(full_scale, {'Level7': 0, 'Level6': 10}))
+    assert full_counts['Level7'] == 0 and full_counts['Level6'] == 10
+    
+    # 比例合计100%且有0分时分数线不为0（0表示不启用该等级），0分的学生未定级
+    full = solve_cutoffs(distribution, {'Level7': 10, 'Level6': 15, 'Level5': 20, 'Level4': 20, 'Level3': 15, 'Level2': 20})
+    full_counts = distribution.level_counts(full)
+    print(f"  比例合计100%: {full}，{full_counts}")
+    assert full['Level2'] == 1 and full_counts['Level2'] == 19 and full_counts['未定级'] == 1
+    assert list(full.values()) == sorted(full.values())
+    
+    try:
+        solve_cutoffs(distribution, {'Level7': 60, 'Level6': 50})
+        rejected = False
+    except ValueError:
+        rejected = True
+    print(f"  比例合计超过100%时报错: {'✅' if rejected else '❌'}")
+    assert rejected
+    
+    print()
+
+def test_evaluate_scenarios():
+    """测试多组分数线方案的批量评估与逐个分配等级的结果一致"""
+    print("🧪 测试分数线方案对比...")
+    
+    rng = np.random.default_rng(5)
+    test_df = pd.DataFrame({
+        '甲部分数': np.round(rng.uniform(0, 50, 2000), 1),
+        '乙部分数': np.round(rng.uniform(0, 103, 2000), 1)
+    })
+    processed_df = process_data(test_df)
+    distribution = ScoreDistribution.from_processed(processed_df)
+    current = {'Level2': 47, 'Level3': 53, 'Level4': 58, 'Level5': 63, 'Level6': 66, 'Level7': 70}
+    scenarios = pd.DataFrame(
+        [current, dict(current, Level7=80), {'Level2': 0, 'Level3': 60, 'Level4': 55, 'Level5': 0, 'Level6': 90, 'Level7': 85}],
+        index=['当前', '提高Level7', '乱序']
+    )[GRADE_LEVELS]
+    
+    result = evaluate_scenarios(distribution, scenarios, current)
+    current_levels = assign_grades(processed_df, current)['等级']
+    for name, cutoffs in scenarios.iterrows():
+        levels = assign_grades(processed_df, cutoffs.to_dict())['等级']
+        counts = levels.value_counts()
+        same_counts = all(result.loc[name, f"{level}人数"] == counts[level] for level in GRADE_DTYPE.categories)
+        same_changes = result.loc[name, '等级变化人数'] == (levels != current_levels).sum()
+        print(f"  {name}: {'✅' if same_counts and same_changes else '❌'} 等级变化 {result.loc[name, '等级变化人数']} 人")
+        assert same_counts and same_changes
+    
+    percentages = result[[column for column in result.columns if column.endswith('占比')]]
+    assert np.allclose(percentages.sum(axis=1), 100)
+    assert result.loc['当前', '等级变化人数'] == 0
+    
+    print()
+
+def test_scoring_schema():
+    """测试计分方案：默认方案与原公式逐位一致，多部分方案和取整方式按定义计算"""
+    print("📐 测试计分方案...")
+    
+    rng = np.random.default_rng(6)
+    test_df = pd.DataFrame({
+        '甲部分数': np.concatenate([np.round(rng.uniform(0, 50, 5000), 1), [25, 2.5, 7.5]]),
+        '乙部分数': np.concatenate([np.round(rng.uniform(0, 103, 5000), 1), [0, 0, 0]])
+    })
+    expected = [calculate_total_score(row) for row in test_df.to_dict('records')]
+    same = np.array_equal(DEFAULT_SCHEMA.total_scores(test_df), expected)
+    print(f"  默认方案: {'✅' if same else '❌'} {DEFAULT_SCHEMA.describe()}")
+    assert same
+    
+    # 三个部分，各取整方式与逐行计算比较
+    parts_df = pd.DataFrame({
+        '笔试': np.round(rng.uniform(0, 120, 3000), 1),
+        '实验': np.round(rng.uniform(0, 30, 3000), 1),
+        '平时': np.round(rng.uniform(0, 100, 3000))
+    })
+    components = [ScoreComponent('笔试', 120, 0.6), ScoreComponent('实验', 30, 0.25), ScoreComponent('平时', 100, 0.15)]
+    exact = sum(parts_df[c.column].to_numpy() / c.max_score * c.weight * 100 for c in components)
+    references = {
+        'half_even': np.rint(exact), 'half_up': np.floor(exact + 0.5),
+        'floor': np.floor(exact), 'ceil': np.ceil(exact), 'none': exact
+    }
+    for rounding, reference in references.items():
+        schema = ScoringSchema(components, rounding)
+        close = np.allclose(schema.total_scores(parts_df), reference)
+        print(f"  {rounding}: {'✅' if close else '❌'}")
+        assert close
+    
+    # 配置往返、缓存键与处理结果
+    schema = ScoringSchema.from_dict(ScoringSchema(components, 'half_up', '三部分').to_dict())
+    assert schema == ScoringSchema(components, 'half_up') and schema.key != DEFAULT_SCHEMA.key
+    processed_df = process_data(parts_df, schema=schema)
+    assert processed_df['总分'].is_monotonic_decreasing and processed_df['总分'].max() <= 100
+    
+    # 无效方案
+    invalid = [
+        ([ScoreComponent('笔试', 0, 0.5)], 'half_even'),
+        ([ScoreComponent('笔试', 100, 0.6), ScoreComponent('笔试', 100, 0.4)], 'half_even'),
+        ([ScoreComponent('笔试', 100, 0.8), ScoreComponent('实验', 100, 0.4)], 'half_even'),
+        ([ScoreComponent('总分', 100, 1)], 'half_even'),
+        ([ScoreComponent('笔试', 100, 1)], 'round')
+    ]
+    for components, rounding in invalid:
+        try:
+            ScoringSchema(components, rounding)
+        except ValueError:
+            continue
+        raise AssertionError(f"未拒绝无效方案：{components}, {rounding}")
+    print(f"  ✅ {len(invalid)} 个无效方案均被拒绝")
+    
+    # 按方案读取：缺少方案中的列时报告缺失列
+    csv_data = parts_df.assign(姓名='张三', 学号=np.arange(len(parts_df)), 班级='一班').to_csv(index=False).encode('utf-8')
+    cohort = load_upload('schema.csv', csv_data, schema=schema)
+    assert np.array_equal(cohort.processed_df['总分'].to_numpy(), processed_df['总分'].to_numpy())
+    try:
+        load_upload('schema.csv', csv_data)
+    except MissingColumnsError as e:
+        print(f"  ✅ 默认方案读取时报告缺失列: {e}")
+    else:
+        raise AssertionError("默认方案应报告缺少甲/乙部分数")
+    
+    print()
+
+def test_validate_scores():
+    """测试上传校验：非数字、负数、超过满分、学号重复的行被跳过并列入问题报告，其余行正常计算"""
+    print("🧾 测试上传数据校验...")
+    
+    csv_data = (
+        "姓名,学号,班级,甲部分数,乙部分数\n"
+        "张三,001,一班,45,95\n"
+        "李四,002,一班,缺考,88\n"
+        "王五,003,二班,-3,92\n"
+        "赵六,004,二班,48,120\n"
+        "钱七,001,一班,40,80\n"
+        "孙八,005,二班, 30 ,\n"
+    ).encode('utf-8')
+    expected = [
+        (2, '甲部分数', '缺考', '不是数字'),
+        (3, '甲部分数', '-3', '分数为负数'),
+        (4, '乙部分数', '120', '超过满分103'),
+        (5, '学号', '001', '与第1条记录学号重复')
+    ]
+    
+    # xlsx 中数字单元格和文本单元格混在同一列
+    buffer = io.BytesIO()
+    pd.DataFrame({
+        '姓名': ['张三', '李四', '王五', '赵六', '钱七', '孙八'],
+        '学号': ['001', '002', '003', '004', '001', '005'],
+        '班级': ['一班', '一班', '二班', '二班', '一班', '二班'],
+        '甲部分数': [45, '缺考', -3, 48, 40, ' 30 '],
+        '乙部分数': [95, 88, 92, 120, 80, None]
+    }).to_excel(buffer, index=False)
+    
+    for name, file_name, data in [('CSV', '校验.csv', csv_data), ('xlsx', '校验.xlsx', buffer.getvalue())]:
+        valid_df, issues = read_upload(file_name, data)
+        found = list(issues[['序号', '列', '值', '问题']].itertuples(index=False, name=None))
+        print(f"  {name}: {'✅' if found == expected else '❌'} {len(issues)} 处问题，有效 {len(valid_df)} 行")
+        assert found == expected
+        assert valid_df['学号'].tolist() == ['001', '005']
+        assert valid_df['甲部分数'].tolist() == [45.0, 30.0] and valid_df['乙部分数'].tolist() == [95.0, 0.0]
+        assert issues['姓名'].tolist() == ['李四', '王五', '赵六', '钱七']
+    
+    # 学号为空的行被跳过（空白学号之间不算重复），与重复学号同时出现时也不产生类型转换警告
+    blank_ids = pd.DataFrame({
+        '姓名': ['张三', '李四', '王五', '赵六', '钱七'],
+        '学号': ['001', None, ' ', '004', '001'],
+        '班级': ['一班'] * 5,
+        '甲部分数': [45, 40, 30, 20, 10],
+        '乙部分数': [95, 88, 60, 50, 40]
+    })
+    buffer = io.BytesIO()
+    blank_ids.to_excel(buffer, index=False)
+    for file_name, data in [('空学号.csv', blank_ids.to_csv(index=False).encode('utf-8')), ('空学号.xlsx', buffer.getvalue())]:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            valid_df, issues = read_upload(file_name, data)
+        print(f"  {file_name}: {issues['问题'].tolist()}，有效 {len(valid_df)} 行")
+        assert issues['序号'].tolist() == [2, 3, 5]
+        assert issues['问题'].tolist() == ['学号为空', '学号为空', '与第1条记录学号重复']
+        assert valid_df['学号'].tolist() == ['001', '004']
+    
+    # 文本列转换类型时空值保持为空（不变成字符串 'nan'）
+    object_ids = apply_column_dtypes(blank_ids.astype({'学号': object}))
+    assert object_ids['学号'].isna().tolist() == [False, True, False, False, False]
+    
+    # 干净的数据不产生问题，也不复制或删除行
+    clean_df = pd.DataFrame({'姓名': ['甲', '乙'], '学号': ['1', '2'], '甲部分数': [50.0, np.nan], '乙部分数': [0.0, 103.0]})
+    valid_df, issues = validate_scores(clean_df)
+    assert len(issues) == 0 and list(issues.columns) == ['序号', '学号', '姓名', '列', '值', '问题']
+    assert valid_df['甲部分数'].tolist() == [50.0, 0.0]
+    
+    # 计算结果只包含有效行，问题报告随缓存结果保存
+    cohort = load_upload('校验.csv', csv_data)
+    assert len(cohort.processed_df) == 2 and len(cohort.issues) == 4
+    print(f"  ✅ 问题报告随计算结果缓存（{len(cohort.issues)} 处）")
+    
+    print()
+
+def test_rescore_delta():
+    """测试增量计算与完整计算结果相同，以及两次上传的对比"""
+    print("🔁 测试增量更新...")
+    
+    rng = np.random.default_rng(7)
+    base_df = pd.DataFrame({
+        '姓名': [f"学生{i}" for i in range(3000)],
+        '学号': [f"{2024000 + i}" for i in range(3000)],
+        '班级': rng.choice(['一班', '二班', '三班'], 3000),
+        '甲部分数': np.round(rng.uniform(0, 50, 3000), 1),
+        '乙部分数': np.round(rng.uniform(0, 103, 3000), 1)
+    })
+    previous = load_upload('增量.csv', base_df.to_csv(index=False).encode('utf-8'))
+    
+    # 修改部分分数和姓名、删除和新增学生
+    new_df = base_df.copy()
+    changed = rng.choice(3000, 20, replace=False)
+    new_df.loc[changed, '乙部分数'] = np.round(rng.uniform(0, 103, 20), 1)
+    new_df.loc[5, '姓名'] = '改名'
+    new_df = new_df.drop(index=[1, 2, 3]).reset_index(drop=True)
+    new_df.loc[len(new_df)] = ['新同学', '2029999', '二班', 50, 103]
+    new_data = new_df.to_csv(index=False).encode('utf-8')
+    
+    valid_df, _ = read_upload('增量.csv', new_data)
+    processed_df, distribution = rescore_delta(previous, valid_df)
+    expected_df = compact_frame(process_data(valid_df))
+    same = processed_df.equals(expected_df)
+    print(f"  与完整计算结果相同: {'✅' if same else '❌'}")
+    assert same
+    assert np.array_equal(distribution.counts, ScoreDistribution.from_processed(expected_df).counts)
+    
+    # 未修改的行顺序被调整时无法增量计算，由调用方完整计算
+    assert rescore_delta(previous, valid_df.iloc[::-1].reset_index(drop=True)) is None
+    assert rescore_delta(previous, valid_df, ScoringSchema([ScoreComponent('甲部分数', 50, 1)])) is None
+    
+    # 不取整的计分方案（总分为小数）不增量计算；只修改姓名重新上传时完整计算
+    exact = ScoringSchema(DEFAULT_SCHEMA.components, rounding='none')
+    exact_previous = load_upload('增量.csv', base_df.to_csv(index=False).encode('utf-8'), schema=exact)
+    renamed_df = base_df.copy()
+    renamed_df.loc[5, '姓名'] = '改名'
+    renamed_valid, _ = read_upload('增量.csv', renamed_df.to_csv(index=False).encode('utf-8'), schema=exact)
+    assert rescore_delta(exact_previous, renamed_valid, exact) is None
+    renamed = load_upload('增量.csv', renamed_df.to_csv(index=False).encode('utf-8'), schema=exact, previous=exact_previous)
+    assert renamed.processed_df.equals(compact_frame(process_data(renamed_valid, schema=exact), exact.columns))
+    assert np.array_equal(renamed.processed_df['总分'], exact_previous.processed_df['总分'])
+    print(f"  不取整方案改名后完整计算: ✅ 最高分 {renamed.processed_df['总分'].iloc[0]:.4f}")
+    
+    current = load_upload('增量.csv', new_data, previous=previous)
+    assert current.processed_df.equals(expected_df)
+    moves = compare_cohorts(previous, current)
+    counts = moves['变动'].value_counts()
+    print(f"  变动: {counts.to_dict()}")
+    assert counts['🆕 新增'] == 1 and counts['❌ 删除'] == 3
+    assert counts['✏️ 总分变化'] == (moves['原总分'] != moves['总分']).sum()
+    assert moves.loc[moves['学号'].astype(str) == '2029999', '排名'].item() == 1
+    rank_only = moves[moves['变动'] == '↕️ 排名变化']
+    assert (rank_only['原总分'] == rank_only['总分']).all() and (rank_only['排名变化'] != 0).all()
+    
+    # 等级变化按当前分数线判断
+    with_levels = delta_levels(moves, DEFAULT_CUTOFFS)
+    level_moves = with_levels[with_levels['等级变化'] != '']
+    assert (level_moves['原等级'] != level_moves['等级']).all()
+    assert with_levels.loc[with_levels['变动'] == '❌ 删除', '等级'].isna().all()
+    print(f"  ✅ 等级变化 {len(level_moves)} 人")
+    
+    print()
+
 def main():
     """运行所有测试"""
     print("🧪 开始测试 app_cloud_safe.py 核心功能")
@@ -163,10 +999,31 @@ def main():
     
     try:
         test_calculate_total_score()
+        test_default_schema_total_scores()
         test_process_data()
         test_assign_grades()
+        test_assign_grades_binning()
         test_validate_cutoff_input()
         test_ranking_logic()
+        test_counting_rank()
+        test_upload_cache()
+        test_score_distribution()
+        test_level_styles()
+        test_export_results_excel()
+        test_request_export()
+        test_read_csv_fast()
+        test_read_excel_streaming()
+        test_compact_frame()
+        test_memory_budget()
+        test_shared_cohort_cache()
+        test_stage_timer()
+        test_filter_and_pages()
+        test_class_analytics()
+        test_solve_cutoffs()
+        test_evaluate_scenarios()
+        test_scoring_schema()
+        test_validate_scores()
+        test_rescore_delta()
         
         print("🎉 所有测试完成！")
         print("✅ 应用核心功能正常")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+测试 batch_grade.py 的批量处理功能
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from batch_grade import collect_files, load_cutoffs, run_batch, merge_rankings, main as batch_main
+from sample_data import generate_sample_data
+
+def test_batch_grade():
+    """测试多文件并行处理、合并排名及错误汇总"""
+    print("🗂️ 测试批量处理...")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        generate_sample_data(40).to_excel(tmp / '一班.xlsx', index=False)
+        generate_sample_data(25).to_csv(tmp / '二班.csv', index=False)
+        pd.DataFrame({'姓名': ['张三']}).to_csv(tmp / '缺列.csv', index=False)
+        (tmp / '说明.txt').write_text('不是成绩文件', encoding='utf-8')
+        (tmp / 'cutoffs.json').write_text(json.dumps({'Level7': 80}), encoding='utf-8')
+        
+        files = collect_files([str(tmp)])
+        print(f"  找到文件: {[f.name for f in files]}")
+        assert [f.name for f in files] == ['一班.xlsx', '二班.csv', '缺列.csv']
+        
+        cutoffs = load_cutoffs(str(tmp / 'cutoffs.json'))
+        assert cutoffs['Level7'] == 80 and cutoffs['Level2'] == 47
+        
+        results, failures = run_batch(files, cutoffs, tmp / '结果', workers=2, merge_rank=True)
+        print(f"  成功 {len(results)} 个，失败 {len(failures)} 个")
+        assert [r['file'].name for r in results] == ['一班.xlsx', '二班.csv']
+        assert [f.name for f, _ in failures] == ['缺列.csv']
+        assert all(r['output'].exists() for r in results)
+        
+        merged_df = merge_rankings(results, cutoffs)
+        print(f"  合并排名: {len(merged_df)} 条记录，排名范围 {merged_df['排名'].min()} - {merged_df['排名'].max()}")
+        assert len(merged_df) == 65 and merged_df['总分'].is_monotonic_decreasing
+        assert set(merged_df['来源文件']) == {'一班.xlsx', '二班.csv'} and '文件内排名' in merged_df.columns
+        
+        exit_code = batch_main([str(tmp / '*.xlsx'), '-o', str(tmp / '命令行'), '-j', '1'])
+        assert exit_code == 0 and (tmp / '命令行' / '一班_成绩计算结果.xlsx').exists()
+    
+    print()
+
+def main():
+    """运行所有测试"""
+    print("🧪 开始测试 batch_grade.py")
+    print("=" * 50)
+    
+    try:
+        test_batch_grade()
+        
+        print("🎉 所有测试完成！")
+        
+    except Exception as e:
+        print(f"❌ 测试过程中出现错误: {str(e)}")
+        return False
+    
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
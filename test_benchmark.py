@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+测试 benchmark.py 的计时和基准比较
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark import STAGES, run_benchmark, compare_with_baseline, main as benchmark_main
+
+def test_run_benchmark():
+    """测试各阶段均有用时和峰值内存记录"""
+    print("⏱️ 测试基准测试计时...")
+    
+    results = run_benchmark(sizes=[200])
+    
+    print(f"  测试项目: {list(results)}")
+    assert list(results) == [f"200/{stage}" for stage in STAGES]
+    assert all(r['seconds'] > 0 and r['peak_mb'] > 0 for r in results.values())
+    
+    print()
+
+def test_compare_with_baseline():
+    """测试超出容差时判定为变慢，计时抖动不误报"""
+    print("📉 测试与基准比较...")
+    
+    baseline = {
+        '1000/计算': {'seconds': 1.0, 'peak_mb': 100.0},
+        '1000/导出': {'seconds': 0.01, 'peak_mb': 10.0}
+    }
+    results = {
+        '1000/计算': {'seconds': 1.5, 'peak_mb': 130.0},  # 用时和内存都超出 25%
+        '1000/导出': {'seconds': 0.03, 'peak_mb': 10.5},  # 相对变化大但绝对差异很小
+        '1000/读取': {'seconds': 9.0, 'peak_mb': 90.0}   # 没有基准，不比较
+    }
+    
+    regressions = compare_with_baseline(results, baseline, tolerance=0.25)
+    for regression in regressions:
+        print(f"  {regression}")
+    assert len(regressions) == 2 and all(r.startswith('1000/计算') for r in regressions)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline_path = Path(tmp) / 'baseline.json'
+        args = ['--sizes', '100', '--stages', '计算', '--baseline', str(baseline_path), '--no-memory']
+        assert benchmark_main(args + ['--save-baseline']) == 0
+        assert '100/计算' in json.loads(baseline_path.read_text(encoding='utf-8'))
+        
+        # 基准用时远小于实际用时时返回非0
+        baseline_path.write_text(json.dumps({'100/计算': {'seconds': -1.0, 'peak_mb': 0.0}}), encoding='utf-8')
+        assert benchmark_main(args) == 1
+    
+    print()
+
+def main():
+    """运行所有测试"""
+    print("🧪 开始测试 benchmark.py")
+    print("=" * 50)
+    
+    try:
+        test_run_benchmark()
+        test_compare_with_baseline()
+        
+        print("🎉 所有测试完成！")
+        
+    except Exception as e:
+        print(f"❌ 测试过程中出现错误: {str(e)}")
+        return False
+    
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+测试 history_store.py 的历史成绩库
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app_cloud_safe import DEFAULT_CUTOFFS, ClassAnalytics, assign_grades, compact_frame, process_data, validate_scores
+from history_store import HistoryStore
+from sample_data import generate_sample_data
+
+def graded_exam(seed: int, num_students: int = 500) -> pd.DataFrame:
+    """一次考试的定级结果（与页面保存的结果相同：紧凑表示，含班内排名）"""
+    df, _ = validate_scores(generate_sample_data(num_students, seed=seed))
+    processed_df = compact_frame(process_data(df))
+    final_df = assign_grades(processed_df, DEFAULT_CUTOFFS)
+    final_df['班内排名'] = ClassAnalytics.from_processed(processed_df).class_rank_column()
+    return final_df
+
+def test_save_and_query():
+    """测试保存多次考试后查询学生走势和班级走势"""
+    print("🗂️ 测试保存和查询...")
+    
+    store = HistoryStore()
+    exams = {'期中考试': ('2024-11-05', graded_exam(1)), '月考': ('2024-10-08', graded_exam(2))}
+    for name, (taken_at, final_df) in exams.items():
+        store.save_exam(name, final_df, taken_at, DEFAULT_CUTOFFS)
+    
+    listed = store.exams()
+    print(f"  考试列表: {listed['考试'].tolist()}")
+    assert listed['考试'].tolist() == ['月考', '期中考试'] and (listed['人数'] == 500).all()
+    assert store.exam_cutoffs('期中考试') == DEFAULT_CUTOFFS
+    
+    trend = store.student_trend(' 20240005 ')
+    expected = [exams[name][1].set_index('学号').loc[20240005] for name in ('月考', '期中考试')]
+    print(f"  学生走势: {trend[['考试', '总分', '排名', '等级']].values.tolist()}")
+    assert trend['考试'].tolist() == ['月考', '期中考试']
+    assert trend['总分'].tolist() == [float(row['总分']) for row in expected]
+    assert trend['排名'].tolist() == [int(row['排名']) for row in expected]
+    assert trend['班内排名'].tolist() == [int(row['班内排名']) for row in expected]
+    assert trend['等级'].tolist() == [row['等级'] for row in expected]
+    assert len(store.student_trend('不存在')) == 0
+    
+    # 班级走势与当次考试的班级统计一致
+    progression = store.class_progression(['一班'])
+    one_class = exams['期中考试'][1].query("班级 == '一班'")
+    row = progression[progression['考试'] == '期中考试'].iloc[0]
+    print(f"  一班走势: {progression[['考试', '人数', '平均分']].values.tolist()}")
+    assert len(progression) == 2 and row['人数'] == len(one_class)
+    assert abs(row['平均分'] - one_class['总分'].astype(float).mean()) < 1e-9
+    level_columns = [level for level in reversed(DEFAULT_CUTOFFS) if level in progression.columns]
+    assert row[progression.columns[7:]].sum() == len(one_class) and list(progression.columns[7:7 + len(level_columns)]) == level_columns
+    assert store.classes() == sorted(exams['月考'][1]['班级'].astype(str).unique())
+    assert len(store.class_progression()) == 2 * len(store.classes())
+    
+    print()
+
+def test_replace_and_delete():
+    """测试同名考试、覆盖保存和删除（成绩明细随考试一起删除）"""
+    print("♻️ 测试覆盖和删除...")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, '成绩历史.db')
+        store = HistoryStore(path)
+        store.save_exam('期末考试', graded_exam(1), '2025-01-10')
+        
+        try:
+            store.save_exam('期末考试', graded_exam(2))
+            duplicated = False
+        except ValueError:
+            duplicated = True
+        print(f"  同名考试被拒绝: {'✅' if duplicated else '❌'}")
+        assert duplicated
+        try:
+            store.save_exam('  ', graded_exam(2))
+            assert False, "考试名称为空时应抛出 ValueError"
+        except ValueError:
+            pass
+        
+        # 学号为空的记录无法作为历史成绩保存
+        no_ids = graded_exam(2).astype({'学号': object})
+        no_ids.loc[no_ids.index[0], '学号'] = None
+        try:
+            store.save_exam('缺学号', no_ids)
+            assert False, "有学号为空的记录时应抛出 ValueError"
+        except ValueError:
+            pass
+        assert store.exams()['考试'].tolist() == ['期末考试']
+        
+        replacement = graded_exam(3, num_students=300)
+        store.save_exam('期末考试', replacement, '2025-01-10', replace=True)
+        store.close()
+        
+        # 重新打开文件数据库，数据仍在
+        store = HistoryStore(path)
+        assert store.exams()['人数'].tolist() == [300]
+        assert store.student_trend('20240001')['总分'].tolist() == [float(replacement['总分'].iloc[(replacement['学号'] == 20240001).argmax()])]
+        
+        deleted = store.delete_exam('期末考试')
+        print(f"  删除考试: {'✅' if deleted else '❌'}")
+        assert deleted and not store.delete_exam('期末考试')
+        assert len(store.exams()) == 0 and len(store.student_trend('20240001')) == 0 and store.classes() == []
+        store.close()
+    
+    print()
+
+def main():
+    """运行所有测试"""
+    print("🧪 开始测试 history_store.py")
+    print("=" * 50)
+    
+    try:
+        test_save_and_query()
+        test_replace_and_delete()
+        
+        print("🎉 所有测试完成！")
+    
+    except Exception as e:
+        print(f"❌ 测试过程中出现错误: {str(e)}")
+        return False
+    
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
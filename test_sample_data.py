@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+测试 sample_data.py 的示例数据生成
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sample_data import generate_sample_data, iter_sample_chunks, write_sample_data
+
+def test_generate_sample_data():
+    """测试固定种子可重现及各项参数"""
+    print("🎲 测试示例数据生成...")
+    
+    df = generate_sample_data(1000)
+    same = df.equals(generate_sample_data(1000))
+    print(f"  固定种子结果可重现: {'✅' if same else '❌'}")
+    assert same and len(df) == 1000
+    assert df['学号'].iloc[0] == '20240001' and df['学号'].is_unique
+    assert df['甲部分数'].between(0, 50).all() and df['乙部分数'].between(0, 103).all()
+    
+    stress_df = generate_sample_data(20000, num_classes=12, missing_rate=0.1, duplicate_rate=0.5)
+    missing = stress_df['甲部分数'].isna().mean()
+    duplicated = stress_df.duplicated(['甲部分数', '乙部分数']).mean()
+    print(f"  缺失比例 {missing:.2f}，同分比例 {duplicated:.2f}，班级数 {stress_df['班级'].nunique()}")
+    assert 0.08 < missing < 0.12 and duplicated > 0.3 and stress_df['班级'].nunique() == 12
+    
+    chunks = list(iter_sample_chunks(2500, chunk_size=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert pd.concat(chunks)['学号'].is_unique
+    
+    print()
+
+def test_write_sample_data():
+    """测试分批写入 CSV / xlsx / Parquet 文件"""
+    print("💾 测试示例数据写入...")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for suffix, reader in [('.csv', pd.read_csv), ('.xlsx', pd.read_excel), ('.parquet', pd.read_parquet)]:
+            path = write_sample_data(Path(tmp) / f"示例{suffix}", 2500, chunk_size=1000, missing_rate=0.05)
+            df = reader(path)
+            print(f"  {suffix}: {df.shape}")
+            assert df.shape == (2500, 5) and np.isclose(df['乙部分数'].isna().mean(), 0.05, atol=0.02)
+    
+    print()
+
+def main():
+    """运行所有测试"""
+    print("🧪 开始测试 sample_data.py")
+    print("=" * 50)
+    
+    try:
+        test_generate_sample_data()
+        test_write_sample_data()
+        
+        print("🎉 所有测试完成！")
+        
+    except Exception as e:
+        print(f"❌ 测试过程中出现错误: {str(e)}")
+        return False
+    
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)